@@ -1,10 +1,25 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from detect import detect_ingredients
+from ingredients import normalize
 
 app = Flask(__name__)
 CORS(app)  # Allow cross-origin requests from frontend
 
+# Sample logic: static recipe suggestions, keyed by canonical ingredient
+sample_recipes = {
+    normalize(ingredient): recipes for ingredient, recipes in {
+        "onion": ["Onion Pakoda", "Onion Soup"],
+        "tomato": ["Tomato Rice", "Tomato Soup"],
+        "potato": ["Aloo Paratha", "Masala Fries"],
+        "garlic": ["Garlic Bread", "Garlic Noodles"],
+        "cheese": ["Cheese Sandwich", "Mac and Cheese"],
+        "egg": ["Boiled Egg Curry", "Scrambled Eggs"],
+        "apple": ["Apple Pie", "Apple Salad"],
+        "bread": ["Bread Pizza", "French Toast"],
+    }.items()
+}
+
 @app.route('/detect', methods=['POST'])
 def detect_route():
     if 'image' not in request.files:
@@ -20,21 +35,9 @@ def recipe_route():
     data = request.get_json()
     ingredients = data.get('ingredients', [])
 
-    # Sample logic: static recipe suggestions
-    sample_recipes = {
-        "onion": ["Onion Pakoda", "Onion Soup"],
-        "tomato": ["Tomato Rice", "Tomato Soup"],
-        "potato": ["Aloo Paratha", "Masala Fries"],
-        "garlic": ["Garlic Bread", "Garlic Noodles"],
-        "cheese": ["Cheese Sandwich", "Mac and Cheese"],
-        "egg": ["Boiled Egg Curry", "Scrambled Eggs"],
-        "apple": ["Apple Pie", "Apple Salad"],
-        "bread": ["Bread Pizza", "French Toast"],
-    }
-
     matched = []
     for ing in ingredients:
-        matched.extend(sample_recipes.get(ing.lower(), []))
+        matched.extend(sample_recipes.get(normalize(ing), []))
 
     return jsonify({'recipes': list(set(matched))[:5]})  # return top 5 unique
 
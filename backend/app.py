@@ -1,66 +1,128 @@
-from flask import Flask, request, jsonify
+import time
+
+# Measured from here so the startup report includes the imports below
+MODULE_STARTED = time.perf_counter()
+
+import click
+from contextlib import contextmanager
+from flask import Blueprint, Flask, Request, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
+from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity, verify_jwt_in_request
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_
 import os
-from detect import detect_ingredients
-import requests
+from config import Config, MAX_BATCH_IMAGES, MAX_UPLOAD_BYTES
+from models import db, init_db, User, PantryItem, PantryState, FavoriteRecipe, RecipeDetailCache, UserPreference
+import spoonacular
+import compress
+import database
+from database import read_only
+import metrics
+import ranking
+import ratelimit
+import recipe_corpus
+import serializers
+from metrics import ERRORS
+from detect_cache import detection_cache
+from passwords import HashingBusy, password_hasher
+from cache import LRUCache, SQLAlchemyBackend, StaleWhileRevalidateCache, TopKCounter, TwoTierCache
+from jobs import ForegroundTracker, JobRunner
+from recipe_index import RecipeIndex
+from ingredients import normalizer as ingredient_normalizer
+import base64
+import hashlib
+import json
 import re
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///pantrychef.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
-
-db = SQLAlchemy(app)
-jwt = JWTManager(app)
-CORS(app)
-
-# Database Models
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    name = db.Column(db.String(80), nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    # Relationships
-    pantry_items = db.relationship('PantryItem', backref='user', lazy=True, cascade='all, delete-orphan')
-    favorite_recipes = db.relationship('FavoriteRecipe', backref='user', lazy=True, cascade='all, delete-orphan')
-    preferences = db.relationship('UserPreference', backref='user', uselist=False, cascade='all, delete-orphan')
-
-class PantryItem(db.Model):
-    id = db.Column(db.String(36), primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    name = db.Column(db.String(100), nullable=False)
-    quantity = db.Column(db.String(50))
-    category = db.Column(db.String(50), nullable=False)
-    expiry_date = db.Column(db.Date)
-    added_date = db.Column(db.DateTime, default=datetime.utcnow)
-
-class FavoriteRecipe(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    recipe_id = db.Column(db.Integer, nullable=False)
-    spoonacular_id = db.Column(db.Integer)
-    title = db.Column(db.String(200))
-    image_url = db.Column(db.String(500))
-    added_date = db.Column(db.DateTime, default=datetime.utcnow)
-
-class UserPreference(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    dietary_restrictions = db.Column(db.Text)  # JSON string
-    favorite_cuisines = db.Column(db.Text)     # JSON string
-    cooking_skill_level = db.Column(db.String(20))
-    max_cooking_time = db.Column(db.Integer)
+jwt = JWTManager()
+api = Blueprint('api', __name__)
+
+# Formatted Spoonacular recipes keyed by Spoonacular id
+recipe_cache = TwoTierCache(
+    LRUCache(
+        maxsize=int(os.getenv('RECIPE_CACHE_SIZE', '2000')),
+        ttl=int(os.getenv('RECIPE_CACHE_TTL', str(7 * 24 * 3600)))
+    ),
+    SQLAlchemyBackend(db, RecipeDetailCache, max_entries=int(os.getenv('RECIPE_CACHE_MAX_ROWS', '50000')))
+)
+
+# Formatted /recipes results keyed by the canonical ingredient set and filters
+recipe_query_cache = StaleWhileRevalidateCache(
+    maxsize=int(os.getenv('RECIPE_QUERY_CACHE_SIZE', '1000')),
+    ttl=int(os.getenv('RECIPE_QUERY_CACHE_TTL', '900')),
+    stale_ttl=int(os.getenv('RECIPE_QUERY_CACHE_STALE_TTL', str(24 * 3600)))
+)
+
+# Local recipe corpus used when Spoonacular is unavailable
+fallback_index = RecipeIndex(os.getenv(
+    'RECIPE_CORPUS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fallback_recipes.json')
+), key=ingredient_normalizer.normalize)
+FALLBACK_RECIPE_LIMIT = int(os.getenv('FALLBACK_RECIPE_LIMIT', '20'))
+RECIPE_TOP_K = int(os.getenv('RECIPE_TOP_K', '20'))
+
+# Parsed UserPreference rows keyed by user id
+preference_cache = LRUCache(
+    maxsize=int(os.getenv('PREFERENCE_CACHE_SIZE', '10000')),
+    ttl=int(os.getenv('PREFERENCE_CACHE_TTL', '300'))
+)
+
+metrics.registry.add_stats_source('recipe_cache', recipe_cache.stats)
+metrics.registry.add_stats_source('recipe_query_cache', recipe_query_cache.stats)
+metrics.registry.add_stats_source('detection_cache', detection_cache.stats)
+metrics.registry.add_stats_source('password_hashing', password_hasher.stats)
+metrics.registry.add_stats_source('spoonacular', spoonacular.stats)
+metrics.registry.add_stats_source('preference_cache', preference_cache.stats)
+metrics.registry.add_stats_source('ingredient_normalizer', ingredient_normalizer.stats)
+
+# Background prefetching and cache warming, paused while foreground traffic is
+# heavy or Spoonacular is failing
+foreground = ForegroundTracker()
+job_runner = JobRunner(
+    busy=lambda: foreground.busy() or spoonacular.breaker.state != spoonacular.CircuitBreaker.CLOSED
+)
+# Canonical searches by how often they are requested, for cache warming
+frequent_queries = TopKCounter(maxsize=int(os.getenv('FREQUENT_QUERY_TRACK_SIZE', '1000')))
+CACHE_WARM_TOP_N = int(os.getenv('CACHE_WARM_TOP_N', '20'))
+metrics.registry.add_stats_source('jobs', job_runner.stats)
+
+# Rate limit cost of each route, in pantry requests
+ROUTE_COSTS = {
+    'api.register': 5,
+    'api.login': 5,
+    'api.detect_route': 20,
+    'api.detect_batch_route': 50,
+    'api.recipe_route': 10,
+    'api.recipe_search_route': 2,
+    'api.use_it_up_route': 3,
+    'api.bulk_pantry_items': 5,
+}
+rate_limiter = ratelimit.RateLimiter(
+    costs=ROUTE_COSTS, identity=lambda: optional_jwt_identity(), in_flight=lambda: foreground.active)
+metrics.registry.add_stats_source('rate_limit', rate_limiter.stats)
+
+# Body limits for routes that take less than MAX_CONTENT_LENGTH, which is sized
+# for a full /detect/batch; a larger Content-Length is refused before the body is read
+ROUTE_CONTENT_LENGTHS = {
+    # One image plus the multipart framing
+    'api.detect_route': MAX_UPLOAD_BYTES + 64 * 1024,
+}
+
+class RouteLimitedRequest(Request):
+    """Request whose max_content_length is lowered for the routes in ROUTE_CONTENT_LENGTHS"""
+
+    @property
+    def max_content_length(self):
+        limit = super().max_content_length
+        route_limit = ROUTE_CONTENT_LENGTHS.get(self.endpoint)
+        if route_limit is None:
+            return limit
+        return route_limit if limit is None else min(limit, route_limit)
 
 # Authentication Routes
-@app.route('/auth/register', methods=['POST'])
+@api.route('/auth/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
@@ -71,7 +133,7 @@ def register():
         user = User(
             email=data['email'],
             name=data['name'],
-            password_hash=generate_password_hash(data['password'])
+            password_hash=password_hasher.hash(data['password'])
         )
         
         db.session.add(user)
@@ -87,16 +149,23 @@ def register():
                 'name': user.name
             }
         })
+    except HashingBusy as e:
+        return hashing_busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/auth/login', methods=['POST'])
+@api.route('/auth/login', methods=['POST'])
 def login():
     try:
         data = request.get_json()
         user = User.query.filter_by(email=data['email']).first()
         
-        if user and check_password_hash(user.password_hash, data['password']):
+        if user and password_hasher.verify(user.password_hash, data['password']):
+            # Upgrade hashes made with older parameters while we have the password
+            if password_hasher.needs_rehash(user.password_hash):
+                user.password_hash = password_hasher.rehash(data['password'])
+                db.session.commit()
+
             access_token = create_access_token(identity=user.id)
             return jsonify({
                 'access_token': access_token,
@@ -108,71 +177,287 @@ def login():
             })
         
         return jsonify({'error': 'Invalid credentials'}), 401
+    except HashingBusy as e:
+        return hashing_busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Ingredient Detection Route
-@app.route('/detect', methods=['POST'])
+@api.route('/detect', methods=['POST'])
 def detect_route():
+    detect = imaging()
     try:
         if 'image' not in request.files:
             return jsonify({'error': 'No image provided'}), 400
 
         image = request.files['image']
-        ingredients = detect_ingredients(image)
+        ingredients = detect.detect_ingredients(image)
+        # The client asks /recipes for these next
+        prefetch_recipes(ingredients)
 
         return jsonify({'ingredients': ingredients})
+    except detect.ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Upload is larger than {request.max_content_length} bytes'}), 413
     except Exception as e:
         print(f"Detection error: {e}")
+        ERRORS.inc(where='detect_route')
         # Fallback detection
         return jsonify({'ingredients': ['onion', 'garlic', 'tomato']})
 
+@api.route('/detect/batch', methods=['POST'])
+def detect_batch_route():
+    try:
+        images = request.files.getlist('images') or request.files.getlist('image')
+        if not images:
+            return jsonify({'error': 'No images provided'}), 400
+        if len(images) > MAX_BATCH_IMAGES:
+            return jsonify({'error': f'At most {MAX_BATCH_IMAGES} images per batch'}), 400
+
+        import detect_pool
+        results, ingredients = detect_pool.detect_batch(images)
+
+        return jsonify({'results': results, 'ingredients': ingredients})
+    except Exception as e:
+        print(f"Batch detection error: {e}")
+        ERRORS.inc(where='detect_batch_route')
+        return jsonify({'error': str(e)}), 500
+
 # Recipe Search Route
-@app.route('/recipes', methods=['POST'])
+@api.route('/recipes', methods=['POST'])
 def recipe_route():
     try:
         data = request.get_json()
         ingredients = data.get('ingredients', [])
         filters = data.get('filters', {})
 
+        # Signed-in users get results ordered by their saved preferences
+        user_id = optional_jwt_identity()
+        preferences = get_user_preferences(user_id) if user_id else ranking.DEFAULT_PREFERENCES
+        weights = {ing: 1 for ing in ingredients if isinstance(ing, str)}
+
+        # Clients that can render recipes one by one ask for a stream
+        if request.args.get('stream') not in (None, *RECIPE_STREAM_FORMATS):
+            return jsonify({'error': f"stream must be one of {', '.join(RECIPE_STREAM_FORMATS)}"}), 400
+        stream_format = recipe_stream_format()
+        if stream_format:
+            return recipe_stream_response(stream_format, ingredients, filters, weights, preferences)
+
         # Try Spoonacular API first
-        spoonacular_key = os.getenv('SPOONACULAR_API_KEY', 'spoonacular-08c06d722ae247a781cfabe6a09ac558')
-        if spoonacular_key and spoonacular_key != 'demo_key':
-            try:
-                recipes = search_spoonacular_recipes(ingredients, filters, spoonacular_key)
+        spoonacular_key = spoonacular_api_key()
+        if spoonacular_key:
+            with spoonacular_guard():
+                recipes = search_recipes_cached(ingredients, filters, spoonacular_key)
+                recipes = ranking.rank(recipes or [], weights, preferences, top_k=RECIPE_TOP_K)
                 if recipes:
-                    return jsonify({'recipes': recipes})
-            except Exception as e:
-                print(f"Spoonacular API failed: {e}")
+                    return jsonify({'recipes': serializers.recipes(recipes)})
 
         # Fallback to local recipes
-        recipes = get_fallback_recipes(ingredients)
-        return jsonify({'recipes': recipes})
+        recipes = ranking.rank(get_fallback_recipes(ingredients), weights, preferences, top_k=RECIPE_TOP_K)
+        return jsonify({'recipes': serializers.recipes(recipes)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Pantry Management Routes
-@app.route('/pantry', methods=['GET'])
+RECIPE_STREAM_FORMATS = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+
+def recipe_stream_format():
+    """'ndjson' or 'sse' when the client asked for a streamed /recipes response, from ?stream= or Accept"""
+    requested = request.args.get('stream')
+    if requested in RECIPE_STREAM_FORMATS:
+        return requested
+    best = request.accept_mimetypes.best_match(['application/json', *RECIPE_STREAM_FORMATS.values()])
+    for name, mimetype in RECIPE_STREAM_FORMATS.items():
+        if best == mimetype:
+            return name
+    return None
+
+def recipe_stream_response(stream_format, ingredients, filters, weights, preferences):
+    """
+    Stream /recipes results as NDJSON lines or Server-Sent Events.
+
+    Every recipe is sent as a ``recipe`` event once it is formatted, followed
+    by one ``summary`` event. NDJSON lines carry the same events as
+    ``{"event": ..., "data": ...}`` objects.
+    """
+    def encode(event, payload):
+        if stream_format == 'sse':
+            return f"event: {event}\ndata: {current_app.json.dumps(payload)}\n\n"
+        return current_app.json.dumps({'event': event, 'data': payload}) + '\n'
+
+    def generate():
+        try:
+            for event, payload in recipe_events(ingredients, filters, weights, preferences):
+                yield encode(event, serializers.recipe(payload) if event == 'recipe' else payload)
+        except Exception as e:
+            # Headers are already sent, so the error has to travel as an event
+            print(f"Recipe stream failed: {e}")
+            ERRORS.inc(where='recipe_stream')
+            yield encode('error', {'error': str(e)})
+
+    response = current_app.response_class(
+        stream_with_context(generate()), mimetype=RECIPE_STREAM_FORMATS[stream_format])
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream back into one response
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def recipe_events(ingredients, filters, weights, preferences):
+    """
+    Yield ``('recipe', recipe)`` for each /recipes result as soon as it is
+    ready, then one ``('summary', ...)``.
+
+    Spoonacular recipes come in arrival order, so the summary carries the ids
+    in ranked order for the client to re-sort by; local recipes are already
+    ranked when they are sent.
+    """
+    started = time.perf_counter()
+    sent = []
+    source = 'spoonacular'
+    spoonacular_key = spoonacular_api_key()
+    if spoonacular_key:
+        with spoonacular_guard():
+            for recipe in stream_recipes_cached(ingredients, filters, spoonacular_key):
+                if ranking.satisfies_diets(recipe, preferences):
+                    sent.append(recipe)
+                    yield 'recipe', recipe
+
+    if not sent:
+        source = 'local'
+        for recipe in ranking.rank(get_fallback_recipes(ingredients), weights, preferences, top_k=RECIPE_TOP_K):
+            sent.append(recipe)
+            yield 'recipe', recipe
+
+    yield 'summary', {
+        'count': len(sent),
+        'source': source,
+        'order': [recipe['id'] for recipe in ranking.rank(sent, weights, preferences)],
+        'elapsedMs': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+RECIPE_SEARCH_PAGE_MAX = int(os.getenv('RECIPE_SEARCH_PAGE_MAX', '50'))
+
+@api.route('/recipes/search', methods=['GET'])
+@read_only
+def recipe_search_route():
+    """Full-text search over the imported recipe corpus, best match first"""
+    try:
+        query = request.args.get('q', '')
+        ingredients = [ing for ing in request.args.get('ingredients', '').split(',') if ing.strip()]
+        limit = request.args.get('limit', default=20, type=int)
+        offset = request.args.get('offset', default=0, type=int)
+        if not query.strip() and not ingredients:
+            return jsonify({'error': 'q or ingredients is required'}), 400
+        if not 1 <= limit <= RECIPE_SEARCH_PAGE_MAX:
+            return jsonify({'error': f'limit must be between 1 and {RECIPE_SEARCH_PAGE_MAX}'}), 400
+        if offset < 0:
+            return jsonify({'error': 'offset must not be negative'}), 400
+
+        recipes, has_more = recipe_corpus.search(query, ingredients, limit=limit, offset=offset)
+        return jsonify({
+            'recipes': serializers.recipes(recipes),
+            'nextOffset': offset + limit if has_more else None
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+USE_IT_UP_MAX_DAYS = int(os.getenv('USE_IT_UP_MAX_DAYS', '30'))
+
+@api.route('/recipes/use-it-up', methods=['GET'])
 @jwt_required()
-def get_pantry():
+def use_it_up_route():
+    """Recipes ranked by how much of the soon-to-expire pantry they use"""
     try:
         user_id = get_jwt_identity()
-        items = PantryItem.query.filter_by(user_id=user_id).all()
-        
+        days = request.args.get('days', default=3, type=int)
+        limit = request.args.get('limit', default=10, type=int)
+        if not 0 <= days <= USE_IT_UP_MAX_DAYS:
+            return jsonify({'error': f'days must be between 0 and {USE_IT_UP_MAX_DAYS}'}), 400
+
+        # Range scan on the (user_id, expiry_date) index
+        today = datetime.utcnow().date()
+        expiring = db.session.query(PantryItem.name, PantryItem.expiry_date).filter(
+            PantryItem.user_id == user_id,
+            PantryItem.expiry_date >= today,
+            PantryItem.expiry_date <= today + timedelta(days=days)
+        ).order_by(PantryItem.expiry_date).all()
+        if not expiring:
+            return jsonify({'expiring': [], 'recipes': []})
+
+        # The sooner an item expires the more a recipe using it is worth
+        weights = {}
+        for name, expiry_date in expiring:
+            days_left = (expiry_date - today).days
+            weights[name] = max(weights.get(name, 0), 1 + (days - days_left + 1) / (days + 1))
+        ingredients = list(weights)
+
+        candidates = []
+        spoonacular_key = spoonacular_api_key()
+        if spoonacular_key:
+            with spoonacular_guard():
+                candidates = search_recipes_cached(ingredients, {}, spoonacular_key) or []
+        candidates = candidates + fallback_index.match(ingredients, top_k=FALLBACK_RECIPE_LIMIT, weights=weights)
+
         return jsonify({
-            'items': [{
-                'id': item.id,
-                'name': item.name,
-                'quantity': item.quantity,
-                'category': item.category,
-                'expiryDate': item.expiry_date.isoformat() if item.expiry_date else None,
-                'addedDate': item.added_date.isoformat()
-            } for item in items]
+            'expiring': [{
+                'name': name,
+                'expiryDate': expiry_date.isoformat(),
+                'daysLeft': (expiry_date - today).days
+            } for name, expiry_date in expiring],
+            'recipes': serializers.recipes(ranking.rank(
+                candidates, weights, get_user_preferences(user_id), top_k=limit, require_match=True
+            ))
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/pantry', methods=['POST'])
+# Pantry Management Routes
+PANTRY_PAGE_MAX = int(os.getenv('PANTRY_PAGE_MAX', '200'))
+
+@api.route('/pantry', methods=['GET'])
+@jwt_required()
+@read_only
+def get_pantry():
+    try:
+        user_id = get_jwt_identity()
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        if limit is not None and not 1 <= limit <= PANTRY_PAGE_MAX:
+            return jsonify({'error': f'limit must be between 1 and {PANTRY_PAGE_MAX}'}), 400
+
+        # Answer revalidations from the version row without touching the items
+        state = db.session.get(PantryState, user_id)
+        version = state.version if state else 0
+        etag = hashlib.sha1(f'{user_id}:{version}:{limit}:{cursor}'.encode()).hexdigest()
+        last_modified = state.updated_at.replace(microsecond=0, tzinfo=timezone.utc) if state else None
+        if request.if_none_match.contains_weak(etag) or (
+            not request.if_none_match and last_modified and request.if_modified_since
+            and last_modified <= request.if_modified_since
+        ):
+            return pantry_conditional_response(current_app.response_class(), etag, last_modified, status=304)
+
+        query = PantryItem.query.filter_by(user_id=user_id)
+        if cursor:
+            try:
+                added_date, item_id = decode_pantry_cursor(cursor)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            query = query.filter(or_(
+                PantryItem.added_date > added_date,
+                and_(PantryItem.added_date == added_date, PantryItem.id > item_id)
+            ))
+        query = query.order_by(PantryItem.added_date, PantryItem.id)
+        items = query.limit(limit + 1).all() if limit else query.all()
+
+        payload = {'items': serializers.pantry_item.many(items[:limit])}
+        if limit:
+            payload['nextCursor'] = encode_pantry_cursor(items[limit - 1]) if len(items) > limit else None
+
+        return pantry_conditional_response(jsonify(payload), etag, last_modified)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/pantry', methods=['POST'])
 @jwt_required()
 def add_pantry_item():
     try:
@@ -190,22 +475,82 @@ def add_pantry_item():
         )
         
         db.session.add(item)
+        touch_pantry(user_id)
         db.session.commit()
         
+        return jsonify({'item': serializers.pantry_item.one(item)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+PANTRY_BULK_MAX = int(os.getenv('PANTRY_BULK_MAX', '500'))
+PANTRY_FIELDS = {'name': 'name', 'quantity': 'quantity', 'category': 'category', 'expiryDate': 'expiry_date'}
+
+@api.route('/pantry/bulk', methods=['POST'])
+@jwt_required()
+def bulk_pantry_items():
+    """Apply creates, updates and deletes in one transaction.
+
+    Every entry is validated before anything is written; any invalid entry
+    rejects the whole request. Updates and deletes of items the user does
+    not own are reported as not_found. The pantry version only moves when
+    a row actually changes.
+    """
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True)
+        creates, updates, deletes, errors = validate_pantry_bulk(data)
+        if errors:
+            return jsonify({'errors': errors}), 400
+
+        # One query tells us which referenced items exist and what they look like
+        referenced = [entry['id'] for entry in updates] + deletes
+        existing = {}
+        if referenced:
+            rows = db.session.query(
+                PantryItem.id, PantryItem.name, PantryItem.quantity, PantryItem.category,
+                PantryItem.expiry_date, PantryItem.added_date
+            ).filter(PantryItem.user_id == user_id, PantryItem.id.in_(referenced)).all()
+            existing = {row.id: row._asdict() for row in rows}
+
+        import uuid
+        now = datetime.utcnow()
+        new_rows = [dict(entry, id=str(uuid.uuid4()), user_id=user_id, added_date=now) for entry in creates]
+        # Updates that leave every field as it was write nothing and keep the version
+        changed_rows = [
+            entry for entry in updates
+            if entry['id'] in existing and any(existing[entry['id']][column] != value for column, value in entry.items())
+        ]
+        deleted_ids = [item_id for item_id in deletes if item_id in existing]
+
+        if new_rows:
+            db.session.bulk_insert_mappings(PantryItem, new_rows)
+        if changed_rows:
+            db.session.bulk_update_mappings(PantryItem, changed_rows)
+        if deleted_ids:
+            PantryItem.query.filter(
+                PantryItem.user_id == user_id, PantryItem.id.in_(deleted_ids)
+            ).delete(synchronize_session=False)
+        if new_rows or changed_rows or deleted_ids:
+            touch_pantry(user_id)
+        db.session.commit()
+
         return jsonify({
-            'item': {
-                'id': item.id,
-                'name': item.name,
-                'quantity': item.quantity,
-                'category': item.category,
-                'expiryDate': item.expiry_date.isoformat() if item.expiry_date else None,
-                'addedDate': item.added_date.isoformat()
-            }
+            'created': [{'status': 'created', 'item': serializers.pantry_row.one(row)} for row in new_rows],
+            'updated': [
+                {'id': entry['id'], 'status': 'updated', 'item': serializers.pantry_row.one({**existing[entry['id']], **entry})}
+                if entry['id'] in existing else {'id': entry['id'], 'status': 'not_found'}
+                for entry in updates
+            ],
+            'deleted': [
+                {'id': item_id, 'status': 'deleted' if item_id in existing else 'not_found'}
+                for item_id in deletes
+            ]
         })
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/pantry/<item_id>', methods=['PUT'])
+@api.route('/pantry/<item_id>', methods=['PUT'])
 @jwt_required()
 def update_pantry_item(item_id):
     try:
@@ -226,22 +571,14 @@ def update_pantry_item(item_id):
         if 'expiryDate' in data:
             item.expiry_date = datetime.fromisoformat(data['expiryDate']).date() if data['expiryDate'] else None
         
+        touch_pantry(user_id)
         db.session.commit()
         
-        return jsonify({
-            'item': {
-                'id': item.id,
-                'name': item.name,
-                'quantity': item.quantity,
-                'category': item.category,
-                'expiryDate': item.expiry_date.isoformat() if item.expiry_date else None,
-                'addedDate': item.added_date.isoformat()
-            }
-        })
+        return jsonify({'item': serializers.pantry_item.one(item)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/pantry/<item_id>', methods=['DELETE'])
+@api.route('/pantry/<item_id>', methods=['DELETE'])
 @jwt_required()
 def delete_pantry_item(item_id):
     try:
@@ -252,6 +589,7 @@ def delete_pantry_item(item_id):
             return jsonify({'error': 'Item not found'}), 404
         
         db.session.delete(item)
+        touch_pantry(user_id)
         db.session.commit()
         
         return jsonify({'message': 'Item deleted successfully'})
@@ -259,56 +597,56 @@ def delete_pantry_item(item_id):
         return jsonify({'error': str(e)}), 500
 
 # Favorites Routes
-@app.route('/favorites', methods=['GET'])
+@api.route('/favorites', methods=['GET'])
 @jwt_required()
+@read_only
 def get_favorites():
     try:
         user_id = get_jwt_identity()
         favorites = FavoriteRecipe.query.filter_by(user_id=user_id).all()
         
-        return jsonify({
-            'recipes': [{
-                'id': fav.recipe_id,
-                'title': fav.title,
-                'image': fav.image_url,
-                'spoonacularId': fav.spoonacular_id
-            } for fav in favorites]
-        })
+        recipes = serializers.favorite_recipe.many(favorites)
+
+        if request.args.get('hydrate', '').lower() in ('1', 'true', 'yes'):
+            recipes = serializers.recipes(hydrate_favorites(favorites, recipes))
+
+        return jsonify({'recipes': recipes})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/favorites', methods=['POST'])
+@api.route('/favorites', methods=['POST'])
 @jwt_required()
 def add_favorite():
     try:
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        # Check if already favorited
-        existing = FavoriteRecipe.query.filter_by(
-            user_id=user_id, 
-            recipe_id=data['recipeId']
-        ).first()
-        
-        if existing:
-            return jsonify({'message': 'Already in favorites'}), 200
-        
-        favorite = FavoriteRecipe(
-            user_id=user_id,
-            recipe_id=data['recipeId'],
-            spoonacular_id=data.get('spoonacularId'),
-            title=data.get('title'),
-            image_url=data.get('image')
-        )
-        
-        db.session.add(favorite)
+        recipe_id = data['recipeId']
+        spoonacular_id = data.get('spoonacularId')
+        if spoonacular_id is None and isinstance(recipe_id, int) and recipe_id > 0 \
+                and fallback_index.get(recipe_id) is None:
+            # Positive ids that are not bundled recipes can only have come from Spoonacular
+            spoonacular_id = recipe_id
+
+        # Insert unless the unique (user_id, recipe_id) index says it is already there
+        added = insert_ignore_duplicate(FavoriteRecipe, ['user_id', 'recipe_id'], {
+            'user_id': user_id,
+            'recipe_id': recipe_id,
+            'spoonacular_id': spoonacular_id,
+            'title': data.get('title'),
+            'image_url': data.get('image'),
+            'added_date': datetime.utcnow()
+        })
         db.session.commit()
         
+        if not added:
+            return jsonify({'message': 'Already in favorites'}), 200
         return jsonify({'message': 'Added to favorites'})
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/favorites/<int:recipe_id>', methods=['DELETE'])
+@api.route('/favorites/<int(signed=True):recipe_id>', methods=['DELETE'])
 @jwt_required()
 def remove_favorite(recipe_id):
     try:
@@ -327,48 +665,340 @@ def remove_favorite(recipe_id):
         return jsonify({'error': str(e)}), 500
 
 # Helper Functions
-def search_spoonacular_recipes(ingredients, filters, api_key):
-    """Search recipes using Spoonacular API"""
-    ingredient_string = ','.join(ingredients)
-    
-    params = {
-        'apiKey': api_key,
-        'ingredients': ingredient_string,
-        'number': 12,
-        'ranking': 2,
-        'ignorePantry': True,
-        **filters
-    }
-    
-    response = requests.get(
-        'https://api.spoonacular.com/recipes/findByIngredients',
-        params=params,
-        timeout=10
-    )
-    
-    if response.status_code != 200:
-        raise Exception(f"Spoonacular API error: {response.status_code}")
-    
-    recipes_data = response.json()
-    detailed_recipes = []
-    
-    for recipe in recipes_data[:8]:
+def imaging():
+    """The image detection stack, imported on first use so other workers never load it"""
+    import detect
+    return detect
+
+def hashing_busy_response(error):
+    response = jsonify({'error': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def insert_ignore_duplicate(model, conflict_columns, values):
+    """Insert a row in one statement, skipping it if it violates a unique index.
+
+    Returns whether the row was inserted.
+    """
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(model).values(**values).on_conflict_do_nothing(index_elements=conflict_columns)
+        return db.session.execute(statement).rowcount > 0
+    if dialect in ('mysql', 'mariadb'):
+        statement = model.__table__.insert().prefix_with('IGNORE').values(**values)
+        return db.session.execute(statement).rowcount > 0
+
+    from sqlalchemy.exc import IntegrityError
+    try:
+        with db.session.begin_nested():
+            db.session.execute(model.__table__.insert().values(**values))
+        return True
+    except IntegrityError:
+        return False
+
+def get_recipes_by_ids(recipe_ids):
+    """Formatted Spoonacular recipes for many ids: cache first, then one bulk upstream call"""
+    keys = [str(recipe_id) for recipe_id in recipe_ids]
+    found = recipe_cache.get_many(keys)
+    missing = [recipe_id for recipe_id, key in zip(recipe_ids, keys) if key not in found]
+
+    spoonacular_key = spoonacular_api_key()
+    if missing and spoonacular_key:
+        details = {}
+        with spoonacular_guard():
+            deadline = spoonacular.Deadline(spoonacular.REQUEST_DEADLINE)
+            details = spoonacular.get_recipe_details(missing, spoonacular_key, deadline)
+        fresh = {}
+        for recipe_id, detail in details.items():
+            try:
+                fresh[str(recipe_id)] = format_spoonacular_recipe(detail, detail)
+            except Exception as e:
+                print(f"Failed to format recipe {recipe_id}: {e}")
+                ERRORS.inc(where='format_recipe')
+        recipe_cache.set_many(fresh)
+        found.update(fresh)
+
+    return {int(key): recipe for key, recipe in found.items()}
+
+def hydrate_favorites(favorites, stubs):
+    """
+    Replace favorite stubs with full recipes: Spoonacular favorites from
+    Spoonacular, imported ones from the recipes table and the rest from the
+    bundled corpus. Favorites that cannot be found keep their stub.
+    """
+    try:
+        local = recipe_corpus.get_many([fav.recipe_id for fav in favorites if fav.spoonacular_id is None])
+    except Exception as e:
+        db.session.rollback()
+        print(f"Recipe corpus lookup failed: {e}")
+        ERRORS.inc(where='recipe_corpus')
+        local = {}
+    for fav in favorites:
+        if fav.spoonacular_id is None and not recipe_corpus.is_corpus_id(fav.recipe_id):
+            recipe = fallback_index.get(fav.recipe_id)
+            if recipe is not None:
+                local[fav.recipe_id] = recipe
+    remote_ids = list(dict.fromkeys(fav.spoonacular_id for fav in favorites if fav.spoonacular_id is not None))
+    remote = get_recipes_by_ids(remote_ids) if remote_ids else {}
+
+    hydrated = []
+    for fav, stub in zip(favorites, stubs):
+        if fav.spoonacular_id is not None:
+            recipe = remote.get(fav.spoonacular_id)
+        else:
+            recipe = local.get(fav.recipe_id)
+        hydrated.append(dict(recipe, id=fav.recipe_id) if recipe else stub)
+    return hydrated
+
+def touch_pantry(user_id):
+    """Bump the user's pantry version in the current transaction"""
+    state = db.session.get(PantryState, user_id)
+    if state is None:
+        state = PantryState(user_id=user_id, version=0)
+        db.session.add(state)
+    state.version += 1
+    state.updated_at = datetime.utcnow()
+
+def pantry_conditional_response(response, etag, last_modified, status=200):
+    response.status_code = status
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Pantries are per user, so only the browser may reuse them, and only after revalidating
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def encode_pantry_cursor(item):
+    raw = json.dumps([item.added_date.isoformat(), item.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_pantry_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        added_date, item_id = json.loads(raw)
+        return datetime.fromisoformat(added_date), str(item_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_pantry_fields(entry, required=()):
+    """Map API field names to column values, raising ValueError on bad input"""
+    if not isinstance(entry, dict):
+        raise ValueError('Entry must be an object')
+    for field in required:
+        if not entry.get(field):
+            raise ValueError(f'{field} is required')
+    values = {}
+    for field, column in PANTRY_FIELDS.items():
+        if field not in entry:
+            continue
+        value = entry[field]
+        if field == 'expiryDate':
+            value = datetime.fromisoformat(value).date() if value else None
+        elif value is not None and not isinstance(value, str):
+            raise ValueError(f'{field} must be a string')
+        elif field in ('name', 'category') and not value:
+            raise ValueError(f'{field} cannot be empty')
+        values[column] = value
+    return values
+
+def validate_pantry_bulk(data):
+    """Split a bulk request into column mappings, collecting every validation error"""
+    creates, updates, deletes, errors = [], [], [], []
+    if not isinstance(data, dict):
+        errors.append({'error': 'Body must be a JSON object'})
+        return creates, updates, deletes, errors
+    operations = {op: data.get(op) or [] for op in ('create', 'update', 'delete')}
+    for op, entries in operations.items():
+        if not isinstance(entries, list):
+            errors.append({'op': op, 'error': f'{op} must be a list'})
+    if errors:
+        return creates, updates, deletes, errors
+    if sum(len(entries) for entries in operations.values()) > PANTRY_BULK_MAX:
+        errors.append({'error': f'At most {PANTRY_BULK_MAX} operations per request'})
+        return creates, updates, deletes, errors
+
+    for index, entry in enumerate(operations['create']):
         try:
-            # Get detailed recipe information
-            detail_response = requests.get(
-                f'https://api.spoonacular.com/recipes/{recipe["id"]}/information',
-                params={'apiKey': api_key},
-                timeout=10
-            )
-            
-            if detail_response.status_code == 200:
-                detail = detail_response.json()
-                detailed_recipes.append(format_spoonacular_recipe(recipe, detail))
-        except Exception as e:
-            print(f"Failed to get details for recipe {recipe['id']}: {e}")
+            creates.append(parse_pantry_fields(entry, required=('name', 'category')))
+        except (ValueError, TypeError) as e:
+            errors.append({'op': 'create', 'index': index, 'error': str(e)})
+
+    seen = set()
+    for index, entry in enumerate(operations['update']):
+        try:
+            item_id = entry.get('id') if isinstance(entry, dict) else None
+            if not isinstance(item_id, str) or not item_id:
+                raise ValueError('id is required')
+            if item_id in seen:
+                raise ValueError('Duplicate id')
+            seen.add(item_id)
+            updates.append(dict(parse_pantry_fields(entry), id=item_id))
+        except (ValueError, TypeError) as e:
+            errors.append({'op': 'update', 'index': index, 'error': str(e)})
+
+    for index, item_id in enumerate(operations['delete']):
+        if not isinstance(item_id, str) or not item_id:
+            errors.append({'op': 'delete', 'index': index, 'error': 'id must be a string'})
+        elif item_id in seen:
+            errors.append({'op': 'delete', 'index': index, 'error': 'Item is also updated'})
+        else:
+            deletes.append(item_id)
+
+    return creates, updates, deletes, errors
+
+def spoonacular_api_key():
+    """The configured Spoonacular API key, or None when Spoonacular is disabled"""
+    api_key = os.getenv('SPOONACULAR_API_KEY', 'spoonacular-08c06d722ae247a781cfabe6a09ac558')
+    return api_key if api_key and api_key != 'demo_key' else None
+
+@contextmanager
+def spoonacular_guard():
+    """Swallow a failed Spoonacular call so the caller falls through to local recipes"""
+    try:
+        yield
+    except spoonacular.CircuitOpenError:
+        # Upstream is known to be down; not worth logging every request
+        pass
+    except Exception as e:
+        print(f"Spoonacular API failed: {e}")
+        ERRORS.inc(where='spoonacular_search')
+
+def canonicalize_query(ingredients, filters):
+    """Return the ingredient list, filters and cache key shared by equivalent queries"""
+    names = ingredient_normalizer.normalize_all([ing for ing in ingredients if isinstance(ing, str)])
+    canonical_ingredients = sorted({name for name in names if name})
+    canonical_filters = {}
+    for name, value in (filters or {}).items():
+        if value is None or value == '':
             continue
-    
-    return detailed_recipes
+        canonical_filters[name] = value.strip().lower() if isinstance(value, str) else value
+    key = json.dumps([canonical_ingredients, canonical_filters], sort_keys=True)
+    return canonical_ingredients, canonical_filters, key
+
+def search_recipes_cached(ingredients, filters, api_key, track=True):
+    """Search Spoonacular through the query cache, refreshing stale results in the background"""
+    ingredients, filters, key = canonicalize_query(ingredients, filters)
+    app = current_app._get_current_object()
+    if track:
+        frequent_queries.add(key, (ingredients, filters))
+
+    def load():
+        with app.app_context():
+            return load_recipe_search(key, ingredients, filters, api_key)
+
+    return recipe_query_cache.get_or_load(key, load)
+
+def load_recipe_search(key, ingredients, filters, api_key):
+    """Run a canonical search upstream; concurrent loads of the same query share one search"""
+    return spoonacular.single_flight.do(
+        ('search', key), lambda: search_spoonacular_recipes(ingredients, filters, api_key),
+        timeout=spoonacular.REQUEST_DEADLINE)
+
+def stream_recipes_cached(ingredients, filters, api_key):
+    """
+    Yield the recipes for a search one by one.
+
+    A fresh query cache entry is replayed as is; otherwise the search runs
+    upstream and each recipe is yielded as soon as it is formatted. The query
+    cache is only filled once the whole search has been read.
+    """
+    ingredients, filters, key = canonicalize_query(ingredients, filters)
+    frequent_queries.add(key, (ingredients, filters))
+    if recipe_query_cache.fresh_for(key) > 0:
+        yield from search_recipes_cached(ingredients, filters, api_key, track=False)
+        return
+
+    found = []
+    for position, recipe in iter_spoonacular_recipes(ingredients, filters, api_key):
+        found.append((position, recipe))
+        yield recipe
+    recipe_query_cache.set(key, [recipe for _, recipe in sorted(found, key=lambda item: item[0])])
+
+def prefetch_recipes(ingredients):
+    """Start loading /recipes results for freshly detected ingredients before the client asks"""
+    spoonacular_key = spoonacular_api_key()
+    if not ingredients or not spoonacular_key:
+        return
+    _, _, key = canonicalize_query(ingredients, {})
+    if recipe_query_cache.fresh_for(key) > 0:
+        return
+    app = current_app._get_current_object()
+
+    def prefetch():
+        with app.app_context():
+            search_recipes_cached(ingredients, {}, spoonacular_key, track=False)
+
+    job_runner.submit(('prefetch', key), prefetch)
+
+def warm_recipe_cache(app):
+    """Reload the most requested searches that are stale or about to be"""
+    spoonacular_key = spoonacular_api_key()
+    if not spoonacular_key:
+        return
+    interval = app.config['CACHE_WARM_INTERVAL']
+    with app.app_context():
+        for key, (ingredients, filters) in frequent_queries.top(CACHE_WARM_TOP_N):
+            if recipe_query_cache.fresh_for(key) > interval:
+                continue
+            if job_runner.busy():
+                break
+            try:
+                recipe_query_cache.set(key, load_recipe_search(key, ingredients, filters, spoonacular_key))
+            except Exception as e:
+                print(f"Cache warming failed for {key}: {e}")
+                ERRORS.inc(where='warm_recipe_cache')
+    frequent_queries.decay()
+
+def iter_spoonacular_recipes(ingredients, filters, api_key):
+    """
+    Search recipes using Spoonacular API, yielding ``(position, recipe)`` as
+    each recipe is ready.
+
+    Cached recipes come out right after the search; the others follow as their
+    details arrive and are formatted. ``position`` is the recipe's place in
+    the search results.
+    """
+    deadline = spoonacular.Deadline(spoonacular.REQUEST_DEADLINE)
+    recipes_data = spoonacular.find_by_ingredients(ingredients, filters, api_key, deadline)[:8]
+
+    # Serve known recipes from the cache and only look up the rest upstream
+    cached = recipe_cache.get_many([str(recipe['id']) for recipe in recipes_data])
+    missing = {}
+    for position, recipe in enumerate(recipes_data):
+        if str(recipe['id']) in cached:
+            yield position, cached[str(recipe['id'])]
+        else:
+            missing[recipe['id']] = (position, recipe)
+    if not missing:
+        return
+
+    fresh = {}
+    try:
+        for recipe_id, detail in spoonacular.iter_recipe_details(list(missing), api_key, deadline):
+            if recipe_id not in missing:
+                continue
+            position, recipe = missing[recipe_id]
+            try:
+                formatted = format_spoonacular_recipe(recipe, detail)
+            except Exception as e:
+                print(f"Failed to format recipe {recipe_id}: {e}")
+                ERRORS.inc(where='format_recipe')
+                continue
+            fresh[str(recipe_id)] = formatted
+            yield position, formatted
+    finally:
+        # Also keeps what was formatted before a streaming client went away
+        recipe_cache.set_many(fresh)
+
+def search_spoonacular_recipes(ingredients, filters, api_key):
+    """Search recipes using Spoonacular API"""
+    found = sorted(iter_spoonacular_recipes(ingredients, filters, api_key), key=lambda item: item[0])
+    return [recipe for _, recipe in found]
 
 def format_spoonacular_recipe(recipe, detail):
     """Format Spoonacular recipe data"""
@@ -383,6 +1013,7 @@ def format_spoonacular_recipe(recipe, detail):
         'ingredients': [ing['original'] for ing in detail.get('extendedIngredients', [])],
         'instructions': [step['step'] for step in detail.get('analyzedInstructions', [{}])[0].get('steps', [])],
         'tags': get_recipe_tags_from_spoonacular(detail),
+        'cuisines': detail.get('cuisines', []),
         'nutrition': extract_nutrition(detail.get('nutrition')),
         'rating': 4.2 + (hash(str(recipe['id'])) % 100) / 100 * 0.6,
         'reviews': 100 + (hash(str(recipe['id'])) % 900),
@@ -460,104 +1091,119 @@ def extract_nutrition(nutrition_data):
         'fiber': f"{round(nutrients.get('Fiber', 0))}g"
     }
 
+def optional_jwt_identity():
+    """The signed-in user's id, or None for anonymous calls and expired or invalid tokens"""
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        # A stale token must not lock a returning user out of public routes
+        return None
+
+def get_user_preferences(user_id):
+    """The user's parsed ranking preferences, read from the database at most once per cache TTL"""
+    preferences = preference_cache.get(user_id)
+    if preferences is None:
+        preferences = ranking.Preferences.from_model(UserPreference.query.filter_by(user_id=user_id).first())
+        preference_cache.set(user_id, preferences)
+    return preferences
+
 def get_fallback_recipes(ingredients):
-    """Fallback recipe database"""
-    recipe_database = [
-        {
-            'id': 1,
-            'title': 'Classic Vegetable Stir Fry',
-            'image': 'https://images.pexels.com/photos/1640777/pexels-photo-1640777.jpeg?auto=compress&cs=tinysrgb&w=400',
-            'cookTime': '20 minutes',
-            'servings': 4,
-            'difficulty': 'Easy',
-            'description': 'A quick and healthy stir fry using fresh vegetables.',
-            'ingredients': ['Mixed vegetables', 'Garlic', 'Ginger', 'Soy sauce'],
-            'instructions': [
-                'Heat oil in a large wok',
-                'Add garlic and ginger',
-                'Add vegetables and stir-fry',
-                'Add sauce and serve'
-            ],
-            'tags': ['Vegetarian', 'Quick', 'Healthy'],
-            'rating': 4.5,
-            'reviews': 234,
-            'youtubeUrl': 'https://www.youtube.com/watch?v=Ug_VJVkULks'
-        },
-        {
-            'id': 2,
-            'title': 'Garlic Herb Roasted Potatoes',
-            'image': 'https://images.pexels.com/photos/1893556/pexels-photo-1893556.jpeg?auto=compress&cs=tinysrgb&w=400',
-            'cookTime': '35 minutes',
-            'servings': 6,
-            'difficulty': 'Easy',
-            'description': 'Crispy roasted potatoes with fresh herbs.',
-            'ingredients': ['Potatoes', 'Garlic', 'Herbs', 'Olive oil'],
-            'instructions': [
-                'Preheat oven to 425°F',
-                'Cut potatoes into chunks',
-                'Toss with oil and seasonings',
-                'Roast until golden'
-            ],
-            'tags': ['Vegetarian', 'Side Dish'],
-            'rating': 4.7,
-            'reviews': 189,
-            'youtubeUrl': 'https://www.youtube.com/watch?v=argKpeiKFfo'
-        },
-        {
-            'id': 3,
-            'title': 'Creamy Tomato Pasta',
-            'image': 'https://images.pexels.com/photos/1640777/pexels-photo-1640777.jpeg?auto=compress&cs=tinysrgb&w=400',
-            'cookTime': '25 minutes',
-            'servings': 4,
-            'difficulty': 'Medium',
-            'description': 'Rich and creamy tomato pasta with fresh herbs.',
-            'ingredients': ['Pasta', 'Tomatoes', 'Cream', 'Garlic', 'Basil'],
-            'instructions': [
-                'Cook pasta according to package directions',
-                'Sauté garlic in olive oil',
-                'Add tomatoes and simmer',
-                'Stir in cream and herbs',
-                'Toss with pasta and serve'
-            ],
-            'tags': ['Vegetarian', 'Comfort Food', 'Italian'],
-            'rating': 4.6,
-            'reviews': 312,
-            'youtubeUrl': 'https://www.youtube.com/watch?v=bJUiWdM__Qw'
-        },
-        {
-            'id': 4,
-            'title': 'Honey Garlic Chicken',
-            'image': 'https://images.pexels.com/photos/2456435/pexels-photo-2456435.jpeg?auto=compress&cs=tinysrgb&w=400',
-            'cookTime': '30 minutes',
-            'servings': 4,
-            'difficulty': 'Medium',
-            'description': 'Sweet and savory chicken with honey garlic glaze.',
-            'ingredients': ['Chicken', 'Honey', 'Garlic', 'Soy sauce', 'Ginger'],
-            'instructions': [
-                'Season chicken with salt and pepper',
-                'Cook chicken in a skillet until golden',
-                'Mix honey, garlic, soy sauce, and ginger',
-                'Pour sauce over chicken and simmer',
-                'Serve with rice or vegetables'
-            ],
-            'tags': ['Protein', 'Asian', 'Sweet & Savory'],
-            'rating': 4.8,
-            'reviews': 456,
-            'youtubeUrl': 'https://www.youtube.com/watch?v=BL5eZ2pXGQs'
-        }
-    ]
-    
-    # Filter recipes based on ingredients
-    matching_recipes = []
-    for recipe in recipe_database:
-        if any(ing.lower() in [i.lower() for i in ingredients] for ing in recipe['ingredients']):
-            matching_recipes.append(recipe)
-    
-    return matching_recipes if matching_recipes else recipe_database
+    """Local recipes using the given ingredients: the imported corpus first, then the bundled file"""
+    try:
+        recipes, _ = recipe_corpus.search(
+            ingredients=[ing for ing in ingredients if isinstance(ing, str)], limit=FALLBACK_RECIPE_LIMIT
+        )
+        if recipes:
+            return recipes
+    except Exception as e:
+        db.session.rollback()
+        print(f"Recipe corpus search failed: {e}")
+        ERRORS.inc(where='recipe_corpus')
+
+    matching_recipes = fallback_index.match(ingredients, top_k=FALLBACK_RECIPE_LIMIT)
+    return matching_recipes if matching_recipes else fallback_index.recipes(limit=FALLBACK_RECIPE_LIMIT)
+
+# Application Factory
+def preload_imaging():
+    """Load the detector and start the batch pool now rather than on the first /detect"""
+    import detect_pool
+    from detectors import get_detector
+
+    get_detector()
+    detect_pool.warm_pool_async()
+
+def create_app(config=None):
+    """Build the app; pass a dict to override settings from Config"""
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.request_class = RouteLimitedRequest
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+
+    if app.config['TRUSTED_PROXY_COUNT']:
+        count = app.config['TRUSTED_PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=count, x_proto=count, x_host=count)
 
-# Initialize database
-with app.app_context():
-    db.create_all()
+    database.configure(app)
+    db.init_app(app)
+    with app.app_context():
+        database.tune_engines(db)
+    jwt.init_app(app)
+    CORS(app)
+    metrics.init_app(app)
+    # Before foreground tracking, so refused requests never count as in flight
+    rate_limiter.init_app(app)
+    foreground.init_app(app)
+    job_runner.init_app(app)
+    serializers.init_app(app)
+    compress.init_app(app)
+    app.register_blueprint(api)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create missing tables and indexes."""
+        init_db()
+        print('Database schema is up to date')
+
+    @app.cli.command('import-recipes')
+    @click.argument('path')
+    @click.option('--chunk-size', default=recipe_corpus.IMPORT_CHUNK_SIZE, show_default=True,
+                  help='Rows per insert transaction.')
+    def import_recipes_command(path, chunk_size):
+        """Import a CSV or JSON Lines recipe dump into the searchable corpus."""
+        init_db()
+        imported, skipped = recipe_corpus.import_recipes(path, chunk_size)
+        print(f'Imported {imported} recipes, skipped {skipped} without a title')
+
+    if app.config['AUTO_CREATE_SCHEMA']:
+        with app.app_context():
+            init_db()
+    if app.config['PRELOAD_IMAGING']:
+        preload_imaging()
+    if app.config['CACHE_WARM_INTERVAL'] > 0:
+        job_runner.schedule('warm-recipe-cache', app.config['CACHE_WARM_INTERVAL'], lambda: warm_recipe_cache(app))
+
+    finished = time.perf_counter()
+    app.extensions['startup'] = {
+        'import_seconds': started - MODULE_STARTED,
+        'create_app_seconds': finished - started,
+        'schema_created': app.config['AUTO_CREATE_SCHEMA'],
+        'imaging_preloaded': app.config['PRELOAD_IMAGING']
+    }
+    metrics.registry.add_stats_source('startup', lambda: app.extensions['startup'])
+    metrics.registry.add_stats_source('db_pool', lambda: database.pool_stats(db))
+    print(
+        f"PantryChef ready in {finished - MODULE_STARTED:.3f}s "
+        f"(imports {started - MODULE_STARTED:.3f}s, app setup {finished - started:.3f}s, "
+        f"schema {'created' if app.config['AUTO_CREATE_SCHEMA'] else 'skipped'}, "
+        f"imaging {'preloaded' if app.config['PRELOAD_IMAGING'] else 'lazy'})"
+    )
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app = create_app()
+    with app.app_context():
+        init_db()
+    app.run(debug=True)
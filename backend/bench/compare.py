@@ -0,0 +1,45 @@
+"""
+Compare two run_bench.py reports route by route:
+
+    python compare.py results/baseline.json results/candidate.json
+"""
+import json
+import sys
+
+
+def change(before, after):
+    if not before or after is None:
+        return ''
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def main(baseline_path, candidate_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    print(f"{'route':14} {'metric':12} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for route in sorted(set(baseline['routes']) | set(candidate['routes'])):
+        before = baseline['routes'].get(route)
+        after = candidate['routes'].get(route)
+        if not before or not after:
+            print(f"{route:14} only in {'candidate' if after else 'baseline'}")
+            continue
+        rows = [('rps', before['throughput_rps'], after['throughput_rps'])]
+        rows += [(f'{name} ms', before['latency_ms'][name], after['latency_ms'][name]) for name in ('p50', 'p95', 'p99')]
+        rows.append(('errors', before['errors'], after['errors']))
+        for metric, old, new in rows:
+            print(f"{route:14} {metric:12} {old!s:>12} {new!s:>12} {change(old, new):>9}")
+
+    for name in ('server', 'children'):
+        old = (baseline.get('peak_rss_bytes') or {}).get(name)
+        new = (candidate.get('peak_rss_bytes') or {}).get(name)
+        to_mb = lambda value: None if value is None else round(value / 2 ** 20, 1)
+        print(f"{'peak rss':14} {name + ' MB':12} {to_mb(old)!s:>12} {to_mb(new)!s:>12} {change(old, new):>9}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    main(sys.argv[1], sys.argv[2])
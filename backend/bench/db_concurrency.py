@@ -0,0 +1,203 @@
+"""
+Concurrent pantry reads and writes against SQLite, default settings vs tuned.
+
+Writers add a pantry item and bump the pantry version in one transaction,
+as POST /pantry does; readers load a user's pantry page and version, as
+GET /pantry does. Both go through an app from create_app, its SQLAlchemy
+pool and RoutingSession, with an app context per operation the way a
+request has one. Each mode runs on a fresh database file:
+
+    python db_concurrency.py --writers 4 --readers 16 --duration 10
+
+The tuned mode is the app as configured, with database.tune_engines applying
+config.SQLITE_PRAGMAS; the default mode drops those and the engine options.
+After each run the pragmas are read back from pooled connections, and the
+script fails if they are not what the mode should give.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from flask import g  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+import database  # noqa: E402
+from app import create_app, touch_pantry  # noqa: E402
+from config import SQLITE_PRAGMAS  # noqa: E402
+from models import db, PantryItem, PantryState  # noqa: E402
+
+SYNCHRONOUS_LEVELS = {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3}
+TUNED_PRAGMAS = dict(SQLITE_PRAGMAS)
+
+MODES = {
+    # What a bare SQLAlchemy engine gets: rollback journal, FULL sync, pysqlite's 5s timeout
+    'default': {'tuned': False, 'pragmas': {'journal_mode': 'delete', 'synchronous': 2, 'busy_timeout': 5000}},
+    'tuned': {'tuned': True, 'pragmas': {
+        'journal_mode': str(TUNED_PRAGMAS['journal_mode']).lower(),
+        'synchronous': SYNCHRONOUS_LEVELS[str(TUNED_PRAGMAS['synchronous']).upper()],
+        'busy_timeout': int(TUNED_PRAGMAS['busy_timeout'])
+    }},
+}
+# Connections held at once while reading the pragmas back, so more than one comes from the pool
+PRAGMA_CHECK_CONNECTIONS = 4
+
+
+def build_app(path, mode):
+    config = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'AUTO_CREATE_SCHEMA': False,
+        'CACHE_WARM_INTERVAL': 0,
+        'RATE_LIMIT_ENABLED': False,
+        'PRELOAD_IMAGING': False
+    }
+    if not MODES[mode]['tuned']:
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app = create_app(config)
+    if not MODES[mode]['tuned']:
+        # Before the first connection, since journal_mode=WAL sticks to the file
+        with app.app_context():
+            event.remove(db.engine, 'connect', database._apply_sqlite_pragmas)
+    return app
+
+
+def seed(app, users, items_per_user):
+    with app.app_context():
+        db.create_all()
+        now = datetime.utcnow()
+        for user_id in range(users):
+            db.session.add_all(
+                PantryItem(id=str(uuid.uuid4()), user_id=user_id, name=f'item {n}', quantity='1',
+                           category='Vegetables', added_date=now)
+                for n in range(items_per_user)
+            )
+            db.session.add(PantryState(user_id=user_id, version=1, updated_at=now))
+        db.session.commit()
+
+
+def write(app, rng, users):
+    user_id = rng.randrange(users)
+    with app.app_context():
+        try:
+            db.session.add(PantryItem(id=str(uuid.uuid4()), user_id=user_id, name='new item', quantity='1',
+                                      category='Dairy', added_date=datetime.utcnow()))
+            touch_pantry(user_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def read(app, rng, users):
+    user_id = rng.randrange(users)
+    with app.test_request_context():
+        # As @read_only marks GET /pantry
+        g.db_read_only = True
+        db.session.get(PantryState, user_id)
+        PantryItem.query.filter_by(user_id=user_id).order_by(PantryItem.added_date, PantryItem.id).limit(50).all()
+
+
+def read_pragmas(app, names):
+    """The pragmas as each of a few pooled connections, held at once, reports them"""
+    with app.app_context(), ExitStack() as stack:
+        connections = [stack.enter_context(db.engine.connect()) for _ in range(PRAGMA_CHECK_CONNECTIONS)]
+        return [
+            {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar() for name in names}
+            for conn in connections
+        ]
+
+
+def run(mode, args):
+    workdir = tempfile.mkdtemp(prefix='pantrychef-db-bench-')
+    path = os.path.join(workdir, 'bench.db')
+    app = build_app(path, mode)
+    seed(app, args.users, args.items)
+
+    counts = {'write': 0, 'read': 0, 'write_errors': 0, 'read_errors': 0}
+    latencies = {'write': [], 'read': []}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def worker(kind, n):
+        rng = random.Random(args.seed * 1000 + n)
+        operation = write if kind == 'write' else read
+        done = errors = 0
+        local_latencies = []
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                operation(app, rng, args.users)
+                done += 1
+                local_latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                # "database is locked" once the busy timeout runs out
+                errors += 1
+        with lock:
+            counts[kind] += done
+            counts[f'{kind}_errors'] += errors
+            latencies[kind].extend(local_latencies)
+
+    threads = [threading.Thread(target=worker, args=('write', n)) for n in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=('read', args.writers + n)) for n in range(args.readers)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    result = {}
+    for kind in ('write', 'read'):
+        values = sorted(latencies[kind])
+        p99 = values[min(len(values) - 1, int(0.99 * len(values)))] if values else None
+        result[kind] = {
+            'ops_per_second': round(counts[kind] / elapsed, 1),
+            'errors': counts[f'{kind}_errors'],
+            'p99_ms': None if p99 is None else round(p99 * 1000, 2)
+        }
+    expected = MODES[mode]['pragmas']
+    pragmas = read_pragmas(app, expected)
+    result['pragmas'] = {'expected': expected, 'mismatched': [actual for actual in pragmas if actual != expected]}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per mode')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--items', type=int, default=60, help='pantry items per user')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    report = {}
+    for mode in MODES:
+        report[mode] = result = run(mode, args)
+        print(f"{mode:8} writes {result['write']['ops_per_second']:>8}/s (errors {result['write']['errors']}, "
+              f"p99 {result['write']['p99_ms']} ms)  reads {result['read']['ops_per_second']:>8}/s "
+              f"(errors {result['read']['errors']}, p99 {result['read']['p99_ms']} ms)")
+        for actual in result['pragmas']['mismatched']:
+            print(f"{mode:8} pooled connection has {actual}, expected {result['pragmas']['expected']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if any(result['pragmas']['mismatched'] for result in report.values()):
+        sys.exit('Pooled connections did not get the expected SQLite settings')
+
+
+if __name__ == '__main__':
+    main()
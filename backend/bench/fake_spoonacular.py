@@ -0,0 +1,124 @@
+"""
+Local stand-in for the Spoonacular endpoints the backend calls.
+
+Payloads are generated deterministically from the recipe id, so runs are
+comparable. Latency, jitter and error rate are configurable:
+
+    python fake_spoonacular.py --port 8089 --latency-ms 120 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+INGREDIENTS = [
+    'tomato', 'onion', 'garlic', 'potato', 'carrot', 'chicken', 'rice', 'pasta',
+    'cheese', 'egg', 'bread', 'apple', 'basil', 'ginger', 'soy sauce', 'cream',
+    'bell pepper', 'lettuce', 'cucumber', 'mushroom', 'spinach', 'lemon'
+]
+
+
+def make_recipe(recipe_id):
+    rng = random.Random(recipe_id)
+    ingredients = rng.sample(INGREDIENTS, rng.randint(4, 9))
+    minutes = rng.choice([10, 20, 30, 45, 60, 90])
+    return {
+        'id': recipe_id,
+        'title': f"{ingredients[0].title()} and {ingredients[1].title()} Recipe {recipe_id}",
+        'image': f'https://img.example.com/{recipe_id}.jpg',
+        'readyInMinutes': minutes,
+        'servings': rng.randint(1, 8),
+        'summary': '<b>Generated</b> recipe ' * 20,
+        'vegetarian': rng.random() < 0.4,
+        'vegan': rng.random() < 0.15,
+        'glutenFree': rng.random() < 0.3,
+        'dairyFree': rng.random() < 0.3,
+        'healthScore': rng.randint(0, 100),
+        'cuisines': [rng.choice(['Italian', 'Indian', 'Mexican', 'Chinese', 'American'])],
+        'extendedIngredients': [{'original': f'{rng.randint(1, 3)} cups {name}'} for name in ingredients],
+        'analyzedInstructions': [{'steps': [{'step': f'Step {n} ' * 10} for n in range(1, rng.randint(4, 10))]}]
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.config
+        with config['lock']:
+            config['requests'] += 1
+            delay = max(0.0, config['rng'].gauss(config['latency'], config['jitter']))
+            failed = config['rng'].random() < config['error_rate']
+        time.sleep(delay)
+        if failed:
+            return self._send(500, {'status': 'failure'})
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/recipes/findByIngredients':
+            seed = ','.join(sorted(query.get('ingredients', [''])[0].split(',')))
+            rng = random.Random(seed)
+            number = int(query.get('number', ['12'])[0])
+            ids = rng.sample(range(1000, 1000 + config['corpus_size']), number)
+            return self._send(200, [{
+                'id': recipe['id'], 'title': recipe['title'], 'image': recipe['image']
+            } for recipe in map(make_recipe, ids)])
+        if url.path == '/recipes/informationBulk':
+            ids = [int(i) for i in query.get('ids', [''])[0].split(',') if i]
+            return self._send(200, [make_recipe(i) for i in ids])
+        match = re.fullmatch(r'/recipes/(\d+)/information', url.path)
+        if match:
+            return self._send(200, make_recipe(int(match.group(1))))
+        return self._send(404, {'status': 'failure', 'message': 'Not found'})
+
+
+def start(port=0, latency_ms=100, jitter_ms=20, error_rate=0.0, corpus_size=5000, seed=42):
+    """Start the server on a daemon thread and return it; ``server.server_port`` is the bound port"""
+    config = {
+        'latency': latency_ms / 1000.0,
+        'jitter': jitter_ms / 1000.0,
+        'error_rate': error_rate,
+        'corpus_size': corpus_size,
+        'rng': random.Random(seed),
+        'lock': threading.Lock(),
+        'requests': 0
+    }
+    handler = type('ConfiguredHandler', (Handler,), {'config': config})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name='fake-spoonacular', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--corpus-size', type=int, default=5000)
+    args = parser.parse_args()
+    server = start(args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.corpus_size)
+    print(f"Fake Spoonacular listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,76 @@
+"""
+Token bucket store throughput and agreement across worker processes.
+
+Every process takes from the same few client buckets as fast as it can, the
+way gunicorn workers share the store. With no refill, the total granted must
+come out at exactly the bucket size per client however the takes interleave:
+
+    python rate_limit_store.py --processes 4 --clients 8 --takes 5000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from ratelimit import TokenBucketStore  # noqa: E402
+
+
+def hammer(path, burst, clients, takes, worker, results):
+    store = TokenBucketStore(path, burst=burst, rate=0)
+    granted = 0
+    started = time.perf_counter()
+    for n in range(takes):
+        allowed, _ = store.take(f'client-{(worker + n) % clients}', 1)
+        granted += allowed
+    results.put((granted, time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--takes', type=int, default=5000, help='takes per process')
+    parser.add_argument('--burst', type=int, default=1000)
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='pantrychef-ratelimit-bench-'), 'buckets.db')
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=hammer, args=(path, args.burst, args.clients, args.takes, n, results))
+        for n in range(args.processes)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    granted = sum(count for count, _ in outcomes)
+    expected = min(args.burst * args.clients, args.processes * args.takes)
+    report = {
+        'takes_per_second': round(args.processes * args.takes / elapsed, 1),
+        'mean_take_us': round(sum(seconds for _, seconds in outcomes) / (args.processes * args.takes) * 1e6, 1),
+        'granted': granted,
+        'expected': expected
+    }
+    print(f"{report['takes_per_second']}/s across {args.processes} processes, "
+          f"{report['mean_take_us']} us per take, granted {granted} of {expected} expected")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if granted != expected:
+        sys.exit('Workers disagreed on the bucket balances')
+
+
+if __name__ == '__main__':
+    main()
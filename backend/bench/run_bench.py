@@ -0,0 +1,316 @@
+"""
+Load-test the backend against a local fake Spoonacular.
+
+Starts fake_spoonacular and backend/app.py on free ports with a throwaway
+SQLite database. It seeds users and pantries, then drives each route at a
+fixed concurrency for a fixed time and writes a JSON report:
+
+    python run_bench.py --routes recipes,detect,pantry --concurrency 16 \\
+        --duration 20 --latency-ms 150 --output results/baseline.json
+    python compare.py results/baseline.json results/candidate.json
+"""
+import argparse
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+import fake_spoonacular
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+SAMPLE_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'uploads')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def read_peak_rss(pid):
+    """Peak resident set size (VmHWM) of a process in bytes, Linux only"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+    return children + [grandchild for child in children for grandchild in child_pids(child)]
+
+
+# Fixtures
+
+def load_images(fixture_dir, synthetic_count):
+    """Sample uploads from the repo plus synthetic 12 MP JPEGs, as (name, bytes, content type)"""
+    images = []
+    if os.path.isdir(SAMPLE_DIR):
+        for name in sorted(os.listdir(SAMPLE_DIR)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                with open(os.path.join(SAMPLE_DIR, name), 'rb') as f:
+                    content_type = 'image/png' if name.lower().endswith('.png') else 'image/jpeg'
+                    images.append((name, f.read(), content_type))
+
+    from PIL import Image
+    for n in range(synthetic_count):
+        path = os.path.join(fixture_dir, f'synthetic-12mp-{n}.jpg')
+        if not os.path.exists(path):
+            noise = Image.effect_noise((4000, 3000), 40 + n * 10)
+            gradient = Image.linear_gradient('L').resize((4000, 3000))
+            Image.merge('RGB', (noise, gradient, gradient.transpose(Image.FLIP_LEFT_RIGHT))).save(path, quality=90)
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read(), 'image/jpeg'))
+    return images
+
+
+def seed_users(base_url, users, items_per_user, rng):
+    """Register users and fill each pantry in one bulk request, returning their tokens"""
+    tokens = []
+    today = datetime.utcnow().date()
+    for n in range(users):
+        response = requests.post(f'{base_url}/auth/register', json={
+            'email': f'bench-{n}-{rng.random()}@example.com', 'name': f'Bench {n}', 'password': 'bench-password'
+        })
+        response.raise_for_status()
+        token = response.json()['access_token']
+        items = [{
+            'name': rng.choice(fake_spoonacular.INGREDIENTS),
+            'quantity': f'{rng.randint(1, 5)}',
+            'category': 'Vegetables',
+            'expiryDate': (today + timedelta(days=rng.randint(0, 14))).isoformat()
+        } for _ in range(items_per_user)]
+        requests.post(f'{base_url}/pantry/bulk', json={'create': items},
+                      headers={'Authorization': f'Bearer {token}'}).raise_for_status()
+        tokens.append(token)
+    return tokens
+
+
+# Scenarios, each returning a callable that performs one request
+
+def recipes_scenario(base_url, args, rng, **_):
+    queries = [rng.sample(fake_spoonacular.INGREDIENTS, rng.randint(2, 5)) for _ in range(args.query_pool)]
+
+    def call(session, local_rng):
+        return session.post(f'{base_url}/recipes', json={'ingredients': local_rng.choice(queries)})
+    return call
+
+
+def detect_scenario(base_url, images, **_):
+    def call(session, local_rng):
+        name, data, content_type = local_rng.choice(images)
+        return session.post(f'{base_url}/detect', files={'image': (name, io.BytesIO(data), content_type)})
+    return call
+
+
+def detect_batch_scenario(base_url, images, args, **_):
+    def call(session, local_rng):
+        batch = [local_rng.choice(images) for _ in range(args.batch_size)]
+        files = [('images', (name, io.BytesIO(data), content_type)) for name, data, content_type in batch]
+        return session.post(f'{base_url}/detect/batch', files=files)
+    return call
+
+
+def pantry_scenario(base_url, tokens, **_):
+    def call(session, local_rng):
+        token = local_rng.choice(tokens)
+        return session.get(f'{base_url}/pantry', headers={'Authorization': f'Bearer {token}'})
+    return call
+
+
+SCENARIOS = {
+    'recipes': recipes_scenario,
+    'detect': detect_scenario,
+    'detect_batch': detect_batch_scenario,
+    'pantry': pantry_scenario,
+}
+
+
+def drive(call, concurrency, duration, seed):
+    """Run ``call`` from ``concurrency`` threads for ``duration`` seconds"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(n):
+        local_rng = random.Random(seed + n)
+        session = requests.Session()
+        local_latencies = []
+        local_statuses = {}
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                status = call(session, local_rng).status_code
+            except requests.RequestException:
+                status = 'error'
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status == 'error' or status >= 400)
+    to_ms = lambda value: None if value is None else round(value * 1000, 2)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'latency_ms': {
+            'mean': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': to_ms(percentile(latencies, 0.50)),
+            'p95': to_ms(percentile(latencies, 0.95)),
+            'p99': to_ms(percentile(latencies, 0.99)),
+            'max': to_ms(latencies[-1] if latencies else None),
+        }
+    }
+
+
+def start_backend(port, env):
+    command = [sys.executable, '-c', (
+        'from app import create_app; '
+        f'create_app().run(host="127.0.0.1", port={port}, threaded=True, debug=False, use_reloader=False)'
+    )]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Backend exited with code {process.returncode}')
+        try:
+            requests.get(f'{base_url}/metrics', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('Backend did not start within 60s')
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', default='recipes,detect,pantry', help=f'comma separated, from {sorted(SCENARIOS)}')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=15, help='seconds per route')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds per route before measuring')
+    parser.add_argument('--latency-ms', type=float, default=150, help='fake Spoonacular latency')
+    parser.add_argument('--jitter-ms', type=float, default=30)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fake Spoonacular error rate')
+    parser.add_argument('--query-pool', type=int, default=50, help='distinct ingredient sets for /recipes')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--pantry-items', type=int, default=60)
+    parser.add_argument('--synthetic-images', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--rate-limit', action='store_true',
+                        help='keep the rate limiter on; all load comes from one address, so it mostly measures 429s')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the backend, e.g. --env RECIPE_QUERY_CACHE_TTL=0')
+    parser.add_argument('--output', default='bench-results.json')
+    args = parser.parse_args()
+
+    routes = [route.strip() for route in args.routes.split(',') if route.strip()]
+    unknown = set(routes) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown routes: {", ".join(sorted(unknown))}')
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='pantrychef-bench-')
+    upstream = fake_spoonacular.start(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                      error_rate=args.error_rate, seed=args.seed)
+    env = dict(os.environ,
+               SPOONACULAR_BASE_URL=f'http://127.0.0.1:{upstream.server_port}',
+               SPOONACULAR_API_KEY='bench',
+               AUTO_CREATE_SCHEMA='1',
+               DATABASE_URL=f'sqlite:///{os.path.join(workdir, "bench.db")}',
+               RATE_LIMIT_ENABLED='1' if args.rate_limit else '0',
+               RATE_LIMIT_DB=os.path.join(workdir, 'ratelimit.db'),
+               PYTHONHASHSEED='0')
+    env.update(item.split('=', 1) for item in args.env)
+
+    process, base_url = start_backend(free_port(), env)
+    try:
+        images = load_images(workdir, args.synthetic_images) if any('detect' in r for r in routes) else []
+        tokens = seed_users(base_url, args.users, args.pantry_items, rng) if 'pantry' in routes else []
+        report = {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+                'git_commit': git_commit(),
+                'python': sys.version.split()[0],
+                'cpus': os.cpu_count(),
+                'config': {key: value for key, value in vars(args).items() if key != 'output'},
+                'fixture_images': [name for name, _, _ in images]
+            },
+            'routes': {}
+        }
+        for route in routes:
+            call = SCENARIOS[route](base_url=base_url, args=args, rng=rng, images=images, tokens=tokens)
+            if args.warmup:
+                drive(call, args.concurrency, args.warmup, args.seed)
+            result = drive(call, args.concurrency, args.duration, args.seed)
+            report['routes'][route] = result
+            print(f"{route:14} {result['throughput_rps']:>8} req/s  "
+                  f"p50 {result['latency_ms']['p50']} ms  p95 {result['latency_ms']['p95']} ms  "
+                  f"p99 {result['latency_ms']['p99']} ms  errors {result['errors']}")
+
+        report['peak_rss_bytes'] = {
+            'server': read_peak_rss(process.pid),
+            'children': sum(read_peak_rss(pid) or 0 for pid in child_pids(process.pid))
+        }
+        report['upstream_requests'] = upstream.config['requests']
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        upstream.shutdown()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+import heapq
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class MemoryBackend:
+    """Local stand-in for a persistent backend, useful for tests and single workers"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        with self._lock:
+            found = {}
+            for key in keys:
+                entry = self._data.get(key)
+                if entry and entry[1] > now:
+                    found[key] = entry[0]
+            return found
+
+    def set_many(self, items, ttl):
+        expires_at = time.time() + ttl
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = (value, expires_at)
+            if len(self._data) > self.max_entries:
+                oldest = sorted(self._data, key=lambda k: self._data[k][1])
+                for key in oldest[:len(self._data) - self.max_entries]:
+                    del self._data[key]
+
+
+class SQLAlchemyBackend:
+    """Persistent backend storing JSON values in a table of the app database.
+
+    The model needs ``key``, ``value``, ``expires_at`` and ``stored_at`` columns.
+    Writes go through their own connection so they never commit the caller's session.
+    """
+
+    def __init__(self, db, model, max_entries=50000, evict_every=100):
+        self.db = db
+        self.model = model
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._writes = 0
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        table = self.model.__table__
+        query = select(table.c.key, table.c.value).where(
+            table.c.key.in_(list(keys)),
+            table.c.expires_at > datetime.utcnow()
+        )
+        with self.db.engine.connect() as conn:
+            return {row.key: json.loads(row.value) for row in conn.execute(query)}
+
+    def set_many(self, items, ttl):
+        if not items:
+            return
+        table = self.model.__table__
+        now = datetime.utcnow()
+        rows = [{
+            'key': key,
+            'value': json.dumps(value),
+            'expires_at': now + timedelta(seconds=ttl),
+            'stored_at': now
+        } for key, value in items.items()]
+        with self.db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.key.in_(list(items))))
+            conn.execute(table.insert(), rows)
+
+        self._writes += len(rows)
+        if self._writes >= self.evict_every:
+            self._writes = 0
+            self.evict()
+
+    def evict(self):
+        """Drop expired rows, then the oldest rows beyond max_entries"""
+        table = self.model.__table__
+        with self.db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.expires_at <= datetime.utcnow()))
+            count = conn.execute(select(func.count()).select_from(table)).scalar()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                oldest = select(table.c.key).order_by(table.c.stored_at).limit(overflow)
+                conn.execute(delete(table).where(table.c.key.in_(oldest.scalar_subquery())))
+
+
+class TwoTierCache:
+    """In-process LRU in front of a shared persistent backend"""
+
+    def __init__(self, local, backend=None, ttl=None):
+        self.local = local
+        self.backend = backend
+        self.ttl = local.ttl if ttl is None else ttl
+        self.backend_hits = 0
+        self.backend_misses = 0
+        self.backend_errors = 0
+
+    def get_many(self, keys):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+
+        if missing and self.backend is not None:
+            try:
+                stored = self.backend.get_many(missing)
+            except Exception as e:
+                print(f"Cache backend read failed: {e}")
+                self.backend_errors += 1
+                stored = {}
+            self.backend_hits += len(stored)
+            self.backend_misses += len(missing) - len(stored)
+            for key, value in stored.items():
+                self.local.set(key, value)
+            found.update(stored)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items):
+        for key, value in items.items():
+            self.local.set(key, value)
+        if items and self.backend is not None:
+            try:
+                self.backend.set_many(items, self.ttl)
+            except Exception as e:
+                print(f"Cache backend write failed: {e}")
+                self.backend_errors += 1
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def stats(self):
+        return {
+            'local': self.local.stats(),
+            'backend_hits': self.backend_hits,
+            'backend_misses': self.backend_misses,
+            'backend_errors': self.backend_errors
+        }
+
+
+class StaleWhileRevalidateCache:
+    """LRU cache that keeps serving expired entries while they refresh in the background.
+
+    Entries are fresh for ``ttl`` seconds and may be served stale for another
+    ``stale_ttl`` seconds, during which the first reader schedules a refresh.
+    Loaders returning an empty result are not cached.
+    """
+
+    def __init__(self, maxsize=500, ttl=300, stale_ttl=3600, refresh_workers=2):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._data = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='cache-refresh')
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, fresh_until, stale_until = entry
+                if now < fresh_until:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if now < stale_until:
+                    self._data.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._executor.submit(self._refresh, key, loader)
+                    return value
+                del self._data[key]
+            self.misses += 1
+
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            self.set(key, loader())
+            self.refreshes += 1
+        except Exception as e:
+            print(f"Background refresh failed for {key}: {e}")
+            self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def set(self, key, value):
+        if not value:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now + self.ttl, now + self.ttl + self.stale_ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def fresh_for(self, key):
+        """Seconds until ``key`` goes stale, 0 if it is stale or missing"""
+        with self._lock:
+            entry = self._data.get(key)
+        return max(0.0, entry[1] - time.monotonic()) if entry is not None else 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors
+        }
+
+
+class TopKCounter:
+    """Approximate counts of the most frequent keys in bounded memory.
+
+    When more than ``maxsize`` keys are tracked the least counted half is
+    dropped. ``decay`` halves every count so old traffic fades out.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._counts = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, value=None):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._values[key] = value
+            if len(self._counts) > self.maxsize:
+                keep = sorted(self._counts, key=self._counts.get, reverse=True)[:self.maxsize // 2]
+                self._counts = {k: self._counts[k] for k in keep}
+                self._values = {k: self._values[k] for k in keep}
+
+    def top(self, n):
+        """The ``n`` most counted ``(key, value)`` pairs, most frequent first"""
+        with self._lock:
+            keys = heapq.nlargest(n, self._counts, key=self._counts.get)
+            return [(key, self._values[key]) for key in keys]
+
+    def decay(self):
+        with self._lock:
+            self._counts = {key: count / 2 for key, count in self._counts.items() if count >= 1}
+            self._values = {key: self._values[key] for key in self._counts}
+
+    def __len__(self):
+        return len(self._counts)
@@ -0,0 +1,65 @@
+import os
+from datetime import timedelta
+
+# Uploads larger than this are rejected before decoding
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(15 * 1024 * 1024)))
+MAX_BATCH_IMAGES = int(os.getenv('DETECT_MAX_BATCH_IMAGES', '10'))
+
+
+def env_flag(name, default='0'):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+# Applied to every new SQLite connection. WAL lets readers keep going while a
+# writer commits, and busy_timeout makes writers queue instead of failing
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_PRAGMAS = (
+    ('journal_mode', os.getenv('SQLITE_JOURNAL_MODE', 'WAL')),
+    ('synchronous', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')),
+    ('busy_timeout', SQLITE_BUSY_TIMEOUT_MS),
+    # Negative sizes are KiB
+    ('cache_size', int(os.getenv('SQLITE_CACHE_SIZE', '-20000'))),
+    ('temp_store', 'MEMORY'),
+)
+
+
+def engine_options(uri):
+    """SQLAlchemy engine options for a database URL"""
+    if uri.startswith('sqlite'):
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        # Drop connections the server or a proxy closed while they sat idle
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    }
+
+
+class Config:
+    SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///pantrychef.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional replica for read-only routes
+    DATABASE_READ_URL = os.getenv('DATABASE_READ_URL')
+    JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string')
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=7)
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', str(MAX_UPLOAD_BYTES * MAX_BATCH_IMAGES + 1024 * 1024)))
+
+    # Seconds between refreshes of the most requested recipe searches; 0 disables it
+    CACHE_WARM_INTERVAL = int(os.getenv('CACHE_WARM_INTERVAL', '300'))
+
+    # Encode JSON with orjson when it is installed
+    FAST_JSON = env_flag('FAST_JSON', '1')
+
+    # Per-client token buckets and load shedding in front of every route
+    RATE_LIMIT_ENABLED = env_flag('RATE_LIMIT_ENABLED', '1')
+    # Reverse proxies in front of the app that append to X-Forwarded-For; without
+    # this, clients behind a proxy are rate limited as the proxy's address
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+
+    # Create tables and indexes in create_app; otherwise run `flask --app app init-db`
+    AUTO_CREATE_SCHEMA = env_flag('AUTO_CREATE_SCHEMA')
+    # Import PIL, load the detector and start the batch pool at startup instead of on first /detect
+    PRELOAD_IMAGING = env_flag('PRELOAD_IMAGING')
@@ -0,0 +1,66 @@
+from functools import wraps
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+from config import SQLITE_PRAGMAS, engine_options
+
+READ_BIND = 'read'
+
+
+class RoutingSession(Session):
+    """Session that sends queries from read-only routes to the read engine when one is configured"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('db_read_only'):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Mark a route as only reading, so its queries may go to the read replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def configure(app):
+    """Fill in engine options and the read bind from the database URLs; call before db.init_app"""
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    read_url = app.config.get('DATABASE_READ_URL')
+    if read_url:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[READ_BIND] = {'url': read_url, **engine_options(read_url)}
+
+
+def tune_engines(db):
+    """Apply the SQLite pragmas to every new connection of each SQLite engine; needs an app context"""
+    for engine in db.engines.values():
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _apply_sqlite_pragmas)
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+def pool_stats(db):
+    """Checked out and idle connections per engine, for pool sizing"""
+    stats = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        if hasattr(pool, 'checkedout'):
+            stats[key or 'default'] = {
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'idle': pool.checkedin(),
+                'overflow': pool.overflow()
+            }
+    return stats
@@ -1,47 +1,133 @@
-import cv2
-import numpy as np
-from PIL import Image
 import io
+import os
+import time
+from PIL import Image
+
+from config import MAX_UPLOAD_BYTES
+from detect_cache import content_hash, detection_cache, perceptual_key
+from detectors import get_batcher, get_detector
+from metrics import ERRORS, IMAGE_DECODE_LATENCY, IMAGE_UPLOAD_BYTES
+
+# Images with more pixels than this are rejected from the header alone
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', str(60 * 1000 * 1000)))
+# Longest side of the image the detector actually looks at
+WORKING_SIZE = int(os.getenv('DETECT_WORKING_SIZE', '256'))
+# Seconds to wait for a micro-batched prediction
+DETECT_TIMEOUT = float(os.getenv('DETECT_TIMEOUT', '10'))
+
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def upload_size(stream):
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def _to_rgb(image):
+    """Convert any PIL mode to RGB, flattening transparency onto white"""
+    if image.mode == 'RGB':
+        return image
+    if image.mode == 'P':
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    if image.mode in ('RGBA', 'LA', 'PA', 'RGBa', 'La'):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    if image.mode in ('I', 'I;16', 'I;16B', 'I;16L', 'F'):
+        # Scale high bit depth grayscale into 8 bits instead of clipping it
+        extrema = image.getextrema()
+        scale = 255.0 / extrema[1] if extrema[1] else 1.0
+        image = image.point(lambda value: value * scale).convert('L')
+    return image.convert('RGB')
+
+
+def check_upload_size(stream):
+    size = upload_size(stream)
+    if size > MAX_UPLOAD_BYTES:
+        raise ImageTooLarge(f"Image is {size} bytes, the limit is {MAX_UPLOAD_BYTES}")
+    return size
+
+
+def load_image(image_file, working_size=WORKING_SIZE):
+    """
+    Decode an upload into a small RGB image.
 
-def detect_ingredients(image_file):
+    JPEGs are decoded directly at reduced scale via draft mode, so a 12 MP
+    photo never exists at full resolution in memory. Other formats are
+    downscaled before any mode conversion.
     """
-    Simple ingredient detection function.
-    In a real implementation, this would use a trained model.
-    For now, we'll return some common ingredients as a fallback.
+    stream = getattr(image_file, 'stream', image_file)
+    size = check_upload_size(stream)
+    started = time.perf_counter()
+
+    try:
+        image = Image.open(stream)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"Image is {width}x{height}, the limit is {MAX_IMAGE_PIXELS} pixels")
+
+    image.draft('RGB', (working_size, working_size))
+    image.thumbnail((working_size, working_size), reducing_gap=2.0)
+    image = _to_rgb(image)
+
+    IMAGE_DECODE_LATENCY.observe(time.perf_counter() - started)
+    IMAGE_UPLOAD_BYTES.observe(size)
+    return image
+
+
+def detect_ingredients(image_file, batched=True):
+    """
+    Detect ingredients in an uploaded image with the configured detector backend.
+
+    Backends that support it are fed through the micro-batching scheduler so
+    concurrent requests share one inference call. Repeated uploads are answered
+    from the detection cache, exact copies without decoding at all.
     """
     try:
-        # Read the image
-        image_bytes = image_file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert PIL image to OpenCV format
-        opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
-        # Simple color-based detection (placeholder logic)
-        # In reality, you'd use a trained YOLO model or similar
-        detected_ingredients = []
-        
-        # Analyze image colors to guess ingredients
-        avg_color = np.mean(opencv_image, axis=(0, 1))
-        
-        # Simple heuristics based on color
-        if avg_color[2] > 100:  # Red channel
-            detected_ingredients.extend(['tomato', 'apple', 'red pepper'])
-        if avg_color[1] > 100:  # Green channel
-            detected_ingredients.extend(['lettuce', 'cucumber', 'green pepper'])
-        if avg_color[0] > 80:   # Blue channel (less common in food)
-            detected_ingredients.extend(['blueberry'])
-        
-        # Add some common ingredients as fallback
-        common_ingredients = ['onion', 'garlic', 'potato', 'carrot']
-        detected_ingredients.extend(common_ingredients)
-        
-        # Remove duplicates and limit to 5 ingredients
-        unique_ingredients = list(set(detected_ingredients))[:5]
-        
-        return unique_ingredients if unique_ingredients else ['onion', 'garlic', 'tomato']
-        
+        stream = getattr(image_file, 'stream', image_file)
+        check_upload_size(stream)
+        digest = content_hash(stream)
+        cached = detection_cache.get_exact(digest)
+        if cached is not None:
+            return cached
+
+        image = load_image(stream)
+        key = perceptual_key(image)
+        cached = detection_cache.get_similar(key)
+        if cached is not None:
+            detection_cache.put(digest, None, cached)
+            return cached
+
+        detector = get_detector()
+        if batched and detector.batched:
+            detected_ingredients = get_batcher().predict(image, timeout=DETECT_TIMEOUT)
+        else:
+            detected_ingredients = detector.predict_batch([image])[0]
+        # Cache what is returned, so a repeat of this image gets the same answer
+        detected_ingredients = detected_ingredients or ['onion', 'garlic', 'tomato']
+        detection_cache.put(digest, key, detected_ingredients)
+
+        return detected_ingredients
+
+    except ImageTooLarge:
+        raise
     except Exception as e:
         print(f"Detection error: {e}")
+        ERRORS.inc(where='detect_ingredients')
         # Return fallback ingredients
-        return ['onion', 'garlic', 'tomato', 'potato', 'carrot']
\ No newline at end of file
+        return ['onion', 'garlic', 'tomato', 'potato', 'carrot']
+
+
+def detect_ingredients_from_bytes(data):
+    """Entry point for worker processes, which receive the upload as bytes"""
+    return detect_ingredients(io.BytesIO(data), batched=False)
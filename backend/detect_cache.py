@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+DETECT_CACHE_SIZE = int(os.getenv('DETECT_CACHE_SIZE', '1024'))
+# Perceptual hashes at most this many bits apart count as the same photo
+DETECT_CACHE_MAX_DISTANCE = int(os.getenv('DETECT_CACHE_MAX_DISTANCE', '5'))
+# Width of the mean color buckets a near-duplicate must share; dHash alone is blind to color
+DETECT_CACHE_COLOR_BUCKET = int(os.getenv('DETECT_CACHE_COLOR_BUCKET', '16'))
+# Images flatter than this (grayscale standard deviation) have a degenerate dHash
+DETECT_CACHE_MIN_STDDEV = float(os.getenv('DETECT_CACHE_MIN_STDDEV', '4'))
+
+
+def content_hash(stream, chunk_size=64 * 1024):
+    """SHA-256 of an upload stream, read in chunks and rewound afterwards"""
+    position = stream.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(position)
+    return digest.hexdigest()
+
+
+def dhash(image, size=8):
+    """64-bit difference hash of an (already reduced) PIL image"""
+    from PIL import Image
+
+    return _dhash_pixels(image.convert('L').resize((size + 1, size), Image.BILINEAR), size)
+
+
+def _dhash_pixels(small, size):
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def perceptual_key(image, size=8):
+    """
+    Near-duplicate key of an (already reduced) PIL image: its dHash and its
+    mean color in coarse buckets, or None for images too flat to tell apart.
+
+    dHash only sees brightness gradients, so a red and a green photo with the
+    same layout hash alike; detectors that look at color must not share results
+    across them.
+    """
+    from PIL import Image, ImageStat
+
+    small = image.convert('L').resize((size + 1, size), Image.BILINEAR)
+    if ImageStat.Stat(small).stddev[0] < DETECT_CACHE_MIN_STDDEV:
+        return None
+    color = tuple(int(channel) // DETECT_CACHE_COLOR_BUCKET for channel in ImageStat.Stat(image.convert('RGB')).mean)
+    return _dhash_pixels(small, size), color
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class DetectionCache:
+    """
+    Detection results keyed by exact content hash, with a perceptual hash fallback.
+
+    Exact hits skip decoding entirely. Near-duplicates (a re-encoded or resized
+    copy of the same photo) are found by scanning the bounded set of perceptual
+    keys for one with the same color signature and a hash within
+    ``max_distance`` bits.
+    """
+
+    def __init__(self, maxsize=DETECT_CACHE_SIZE, max_distance=DETECT_CACHE_MAX_DISTANCE):
+        self.maxsize = maxsize
+        self.max_distance = max_distance
+        self.exact_hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+        self._exact = OrderedDict()
+        self._perceptual = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_exact(self, digest, record_miss=False):
+        """Look up an exact copy; misses only count when no perceptual lookup follows"""
+        with self._lock:
+            result = self._exact.get(digest)
+            if result is not None:
+                self._exact.move_to_end(digest)
+                self.exact_hits += 1
+                return list(result)
+            if record_miss:
+                self.misses += 1
+            return None
+
+    def get_similar(self, key):
+        """Look up a near-duplicate by perceptual_key(); a None key is a miss"""
+        with self._lock:
+            if key is None:
+                self.misses += 1
+                return None
+            phash, color = key
+            best = None
+            best_distance = self.max_distance + 1
+            for candidate in self._perceptual:
+                if candidate[1] != color:
+                    continue
+                distance = hamming(phash, candidate[0])
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+                    if distance == 0:
+                        break
+            if best is None:
+                self.misses += 1
+                return None
+            self._perceptual.move_to_end(best)
+            self.perceptual_hits += 1
+            return list(self._perceptual[best])
+
+    def put(self, digest, key, result):
+        result = tuple(result)
+        with self._lock:
+            for store, store_key in ((self._exact, digest), (self._perceptual, key)):
+                if store_key is None:
+                    continue
+                store[store_key] = result
+                store.move_to_end(store_key)
+                while len(store) > self.maxsize:
+                    store.popitem(last=False)
+
+    def stats(self):
+        lookups = self.exact_hits + self.perceptual_hits + self.misses
+        return {
+            'size': len(self._exact),
+            'maxsize': self.maxsize,
+            'exact_hits': self.exact_hits,
+            'perceptual_hits': self.perceptual_hits,
+            'misses': self.misses,
+            'hit_rate': (self.exact_hits + self.perceptual_hits) / lookups if lookups else 0.0
+        }
+
+
+detection_cache = DetectionCache()
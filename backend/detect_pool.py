@@ -0,0 +1,130 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from config import MAX_UPLOAD_BYTES
+from detect import ImageTooLarge, detect_ingredients_from_bytes, upload_size
+from detect_cache import detection_cache
+from detectors import get_detector
+
+BATCH_WORKERS = int(os.getenv('DETECT_BATCH_WORKERS', str(os.cpu_count() or 1)))
+# Seconds each image may take, counted from when the batch was submitted
+BATCH_IMAGE_TIMEOUT = float(os.getenv('DETECT_BATCH_IMAGE_TIMEOUT', '10'))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    # Load the detector once per worker instead of on its first image
+    get_detector()
+
+
+def _ping():
+    return os.getpid()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Never fork a process that is already running request threads
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(
+                max_workers=BATCH_WORKERS,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_worker
+            )
+        return _pool
+
+
+def discard_pool(pool):
+    """Drop a pool that lost a worker, so the next get_pool() starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_pool():
+    """Start every worker process now rather than on the first batch"""
+    pool = get_pool()
+    futures = [pool.submit(_ping) for _ in range(BATCH_WORKERS)]
+    return {future.result() for future in futures}
+
+
+def warm_pool_async():
+    # Spawned workers re-import the main module; they must not start pools of their own
+    if multiprocessing.parent_process() is not None:
+        return
+    threading.Thread(target=warm_pool, name='detect-pool-warmup', daemon=True).start()
+
+
+def detect_batch(image_files, timeout=BATCH_IMAGE_TIMEOUT):
+    """
+    Detect ingredients in several uploads in parallel across worker processes.
+
+    Exact repeats of earlier uploads are answered from this process's detection
+    cache without being sent to a worker. Returns one result per upload, in
+    order, plus the merged ingredient list.
+    """
+    pool = get_pool()
+    submitted = []
+    for image_file in image_files:
+        stream = getattr(image_file, 'stream', image_file)
+        size = upload_size(stream)
+        if size > MAX_UPLOAD_BYTES:
+            submitted.append((image_file, None, None, f"Image is {size} bytes, the limit is {MAX_UPLOAD_BYTES}"))
+            continue
+        data = stream.read()
+        digest = hashlib.sha256(data).hexdigest()
+        cached = detection_cache.get_exact(digest, record_miss=True)
+        if cached is not None:
+            submitted.append((image_file, digest, cached, None))
+        else:
+            try:
+                future = pool.submit(detect_ingredients_from_bytes, data)
+            except BrokenProcessPool:
+                # A worker died since the last batch (OOM kill, crash); retry once on a new pool
+                discard_pool(pool)
+                pool = get_pool()
+                future = pool.submit(detect_ingredients_from_bytes, data)
+            submitted.append((image_file, digest, future, None))
+
+    deadline = time.monotonic() + timeout
+    results = []
+    merged = []
+    for image_file, digest, future, error in submitted:
+        result = {'filename': getattr(image_file, 'filename', None)}
+        if isinstance(future, list):
+            result['ingredients'] = future
+        elif future is not None:
+            try:
+                result['ingredients'] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                detection_cache.put(digest, None, result['ingredients'])
+            except TimeoutError:
+                future.cancel()
+                error = 'Detection timed out'
+            except ImageTooLarge as e:
+                error = str(e)
+            except BrokenProcessPool as e:
+                print(f"Batch detection worker died on {result['filename']}: {e}")
+                discard_pool(pool)
+                error = 'Detection failed'
+            except Exception as e:
+                print(f"Batch detection error for {result['filename']}: {e}")
+                error = 'Detection failed'
+        if error:
+            result['error'] = error
+            result['ingredients'] = []
+        for ingredient in result['ingredients']:
+            if ingredient not in merged:
+                merged.append(ingredient)
+        results.append(result)
+
+    return results, merged
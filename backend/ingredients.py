@@ -0,0 +1,206 @@
+import os
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+MEMO_SIZE = int(os.getenv('INGREDIENT_MEMO_SIZE', '50000'))
+# Trigram similarity a misspelt name needs to snap onto a known ingredient
+FUZZY_THRESHOLD = float(os.getenv('INGREDIENT_FUZZY_THRESHOLD', '0.6'))
+
+# Canonical ingredient -> other names for it; plurals are handled separately
+SYNONYMS = {
+    'bell pepper': ['red pepper', 'green pepper', 'yellow pepper', 'orange pepper', 'capsicum',
+                    'sweet pepper', 'red bell pepper', 'green bell pepper', 'yellow bell pepper'],
+    'tomato': ['cherry tomato', 'roma tomato', 'plum tomato', 'grape tomato', 'vine tomato'],
+    'potato': ['russet potato', 'baby potato', 'new potato', 'aloo'],
+    'onion': ['yellow onion', 'white onion', 'red onion', 'brown onion'],
+    'scallion': ['green onion', 'spring onion'],
+    'garlic': ['garlic clove'],
+    'cilantro': ['coriander leaf'],
+    'eggplant': ['aubergine', 'brinjal'],
+    'zucchini': ['courgette'],
+    'chickpea': ['garbanzo bean', 'garbanzo', 'chana'],
+    'ground beef': ['beef mince', 'hamburger meat'],
+    'chicken breast': ['boneless chicken breast', 'skinless chicken breast'],
+    'egg': ['large egg', 'whole egg'],
+    'butter': ['unsalted butter', 'salted butter'],
+    'olive oil': ['extra virgin olive oil', 'evoo'],
+    'flour': ['all purpose flour', 'plain flour', 'all-purpose flour'],
+    'sugar': ['granulated sugar', 'white sugar', 'caster sugar'],
+    'cheese': ['cheddar', 'cheddar cheese'],
+    'parmesan': ['parmesan cheese', 'parmigiano reggiano'],
+    'lettuce': ['romaine', 'romaine lettuce', 'iceberg lettuce'],
+    'green bean': ['string bean', 'french bean'],
+    'shrimp': ['prawn'],
+    'rice': ['white rice', 'basmati rice', 'jasmine rice'],
+    'carrot': ['baby carrot'],
+    'apple': ['green apple', 'red apple'],
+    'broccoli': ['broccoli floret'],
+    'mushroom': ['button mushroom', 'cremini mushroom', 'white mushroom'],
+    'spinach': ['baby spinach'],
+    'cucumber': ['english cucumber'],
+    'ginger': ['ginger root'],
+    'milk': ['whole milk'],
+    'yogurt': ['yoghurt', 'plain yogurt', 'greek yogurt'],
+    'soy sauce': ['soya sauce'],
+    'red pepper flake': ['crushed red pepper', 'chili flake', 'chilli flake'],
+}
+
+IRREGULAR_PLURALS = {
+    'leaves': 'leaf', 'halves': 'half', 'loaves': 'loaf', 'knives': 'knife', 'geese': 'goose',
+    'teeth': 'tooth', 'mice': 'mouse', 'chilies': 'chili', 'chillies': 'chilli',
+}
+# Singulars ending in -ie, whose plurals would otherwise become -y
+IE_SINGULARS = {'cookie', 'pie', 'brownie', 'veggie', 'smoothie', 'beanie', 'sweetie'}
+# Words that look plural but are not
+UNCOUNTABLE = {
+    'molasses', 'hummus', 'couscous', 'asparagus', 'swiss', 'series', 'species', 'citrus',
+    'lemongrass', 'watercress', 'bass', 'grass', 'grits',
+}
+
+# Quantities, units and preparation words stripped from recipe ingredient lines
+UNITS = {
+    'cup', 'tablespoon', 'tbsp', 'tbs', 'teaspoon', 'tsp', 'ounce', 'oz', 'pound', 'lb', 'gram',
+    'g', 'kg', 'kilogram', 'ml', 'milliliter', 'l', 'liter', 'litre', 'pinch', 'dash', 'can',
+    'jar', 'package', 'pkg', 'bunch', 'handful', 'slice', 'piece', 'stick', 'sprig', 'quart', 'pint',
+    'lbs', 'ozs', 'tbsps', 'tsps', 'kgs',
+}
+DESCRIPTORS = {
+    'chopped', 'diced', 'minced', 'sliced', 'fresh', 'freshly', 'large', 'small', 'medium', 'finely',
+    'roughly', 'thinly', 'peeled', 'grated', 'shredded', 'crushed', 'halved', 'quartered', 'cubed',
+    'whole', 'raw', 'ripe', 'frozen', 'canned', 'dried', 'cooked', 'optional', 'divided', 'to',
+    'taste', 'of', 'and', 'or', 'for', 'about', 'plus', 'more', 'a', 'an', 'the', 'into', 'cut',
+    'pieces', 'piece', 'softened', 'melted', 'packed', 'heaping', 'level', 'room', 'temperature',
+}
+
+_PARENTHETICAL = re.compile(r'\([^)]*\)')
+_NON_WORD = re.compile(r'[^a-z\s-]+')
+
+
+def singular(word):
+    """English singular of one lower-case word, good enough for ingredient names"""
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or word in UNCOUNTABLE or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies'):
+        return word[:-1] if word[:-1] in IE_SINGULARS else word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'xes', 'sses')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Trigram Jaccard similarity of two trigram sets"""
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared) if shared else 0.0
+
+
+class IngredientNormalizer:
+    """
+    Maps free-text ingredient names onto canonical ones.
+
+    A name is lower-cased, stripped of quantities, units and preparation
+    words, and singularized word by word. The result is looked up in the
+    synonym table, which is compiled once into a flat dict; synonyms that
+    carry a preparation word ("crushed red pepper") are looked up before it
+    is stripped. Names it does not know are matched against the known names
+    by trigram similarity, so misspellings still land on the canonical
+    ingredient. Results are memoized in a bounded LRU cache.
+    """
+
+    def __init__(self, synonyms=SYNONYMS, memo_size=MEMO_SIZE, fuzzy_threshold=FUZZY_THRESHOLD):
+        self.fuzzy_threshold = fuzzy_threshold
+        self._canonical = {}
+        # Synonyms that lose a word to DESCRIPTORS, keyed with it
+        self._literal = {}
+        for canonical, names in synonyms.items():
+            canonical = self.clean(canonical)
+            self._canonical[canonical] = canonical
+            for name in names:
+                literal, cleaned = self.clean(name, descriptors=()), self.clean(name)
+                if literal != cleaned:
+                    self._literal[literal] = canonical
+                else:
+                    self._canonical[cleaned] = canonical
+
+        self._trigrams = defaultdict(list)
+        self._names = list(self._canonical)
+        self._name_trigrams = [trigrams(name) for name in self._names]
+        for index, grams in enumerate(self._name_trigrams):
+            for gram in grams:
+                self._trigrams[gram].append(index)
+
+        self.normalize = lru_cache(maxsize=memo_size)(self._normalize)
+
+    @staticmethod
+    def clean(name, descriptors=DESCRIPTORS):
+        """Lower-cased, singular words of a name without quantities, units or ``descriptors``"""
+        text = _NON_WORD.sub(' ', _PARENTHETICAL.sub(' ', name.lower())).replace('-', ' ')
+        words = [word for word in text.split() if word not in descriptors]
+        # Units only count as units in front of something else ("2 cloves garlic")
+        kept = [word for word in words if singular(word) not in UNITS] or words
+        return ' '.join(singular(word) for word in kept)
+
+    def _normalize(self, name):
+        cleaned = self.clean(name)
+        if not cleaned:
+            return ''
+        canonical = self._literal.get(self.clean(name, descriptors=()))
+        if canonical is None:
+            canonical = self._canonical.get(cleaned)
+        if canonical is not None:
+            return canonical
+        return self._fuzzy(cleaned) or cleaned
+
+    def _fuzzy(self, cleaned):
+        """Closest known name by trigram Jaccard similarity, if it is close enough"""
+        if len(cleaned) < 4:
+            return None
+        grams = trigrams(cleaned)
+        shared = defaultdict(int)
+        for gram in grams:
+            for index in self._trigrams.get(gram, ()):
+                shared[index] += 1
+
+        # A misspelling keeps its word count, a different ingredient usually does not
+        words = cleaned.split()
+        best, best_score = None, self.fuzzy_threshold
+        for index, count in shared.items():
+            if self._names[index].count(' ') != len(words) - 1:
+                continue
+            score = count / (len(grams) + len(self._name_trigrams[index]) - count)
+            if score >= best_score and (len(words) == 1 or self._words_match(words, self._names[index].split())):
+                best, best_score = index, score
+        return None if best is None else self._canonical[self._names[best]]
+
+    def _words_match(self, words, known):
+        # A shared word lifts the similarity of whole names, bringing "green pea"
+        # close to "green pepper"; every word has to be close on its own too
+        return all(
+            similarity(trigrams(word), trigrams(other)) >= self.fuzzy_threshold
+            for word, other in zip(words, known)
+        )
+
+    def normalize_all(self, names):
+        """Normalize many names, cleaning each distinct name only once"""
+        names = list(names)
+        normalize = self.normalize
+        distinct = {name: normalize(name) for name in set(names)}
+        return [distinct[name] for name in names]
+
+    def stats(self):
+        info = self.normalize.cache_info()
+        return {'size': info.currsize, 'maxsize': info.maxsize, 'hits': info.hits, 'misses': info.misses}
+
+
+normalizer = IngredientNormalizer()
+normalize = normalizer.normalize
+normalize_all = normalizer.normalize_all
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '100'))
+# 'drop_newest' rejects new jobs when the queue is full, 'drop_oldest' evicts the longest waiting one
+JOB_DROP_POLICY = os.getenv('JOB_DROP_POLICY', 'drop_oldest')
+# Background jobs pause while more foreground requests than this are in flight
+JOB_MAX_FOREGROUND = int(os.getenv('JOB_MAX_FOREGROUND', '8'))
+
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+
+
+class JobRunner:
+    """
+    Best-effort background work on a few worker threads.
+
+    Jobs are keyed; submitting a key that is already queued or running is a
+    no-op. The queue is bounded and, once full, either refuses the new job or
+    evicts the oldest one depending on ``policy``. While ``busy()`` reports
+    foreground pressure new jobs are refused and queued ones are dropped when
+    they come up, so background work only ever uses idle capacity.
+
+    Worker and schedule threads only start on the first submit or request
+    (see ``init_app``), and start again in a process forked after that, so a
+    runner created at import time or in ``create_app`` still works in workers
+    forked by ``gunicorn --preload``.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE, policy=JOB_DROP_POLICY, busy=None):
+        if policy not in (DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"Unknown drop policy {policy!r}")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.policy = policy
+        self.busy = busy or (lambda: False)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.deduplicated = 0
+        self.dropped_full = 0
+        self.dropped_busy = 0
+        self._queue = OrderedDict()
+        self._running = set()
+        self._threads = []
+        self._schedules = {}
+        self._schedule_threads = []
+        self._pid = None
+        self._condition = threading.Condition()
+
+    def init_app(self, app):
+        # Requests only ever run in the serving process, after any fork
+        app.before_request(self.start)
+
+    def submit(self, key, func, *args, **kwargs):
+        """Queue ``func(*args, **kwargs)``; returns whether it was accepted"""
+        if self.busy():
+            self.dropped_busy += 1
+            return False
+        with self._condition:
+            if key in self._queue or key in self._running:
+                self.deduplicated += 1
+                return False
+            if len(self._queue) >= self.max_queue:
+                if self.policy == DROP_NEWEST:
+                    self.dropped_full += 1
+                    return False
+                self._queue.popitem(last=False)
+                self.dropped_full += 1
+            self._queue[key] = (func, args, kwargs)
+            self.submitted += 1
+            self._condition.notify()
+        self.start()
+        return True
+
+    def schedule(self, name, interval, func):
+        """Submit ``func`` as job ``name`` every ``interval`` seconds once the runner starts; a name is only scheduled once"""
+        with self._condition:
+            if name in self._schedules:
+                return
+            self._schedules[name] = (interval, func)
+            if self._pid == os.getpid():
+                self._start_schedule(name, interval, func)
+
+    def start(self):
+        """Start the threads in this process unless they already run here; cheap enough to call per request"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._condition:
+            if self._pid == pid:
+                return
+            # Threads of a parent process do not exist after a fork
+            self._threads = []
+            self._schedule_threads = []
+            self._running = set()
+            self._pid = pid
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'jobs-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            for name, (interval, func) in self._schedules.items():
+                self._start_schedule(name, interval, func)
+
+    def _start_schedule(self, name, interval, func):
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.submit(name, func)
+
+        thread = threading.Thread(target=loop, name=f'jobs-schedule-{name}', daemon=True)
+        thread.start()
+        self._schedule_threads.append(thread)
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                key, (func, args, kwargs) = self._queue.popitem(last=False)
+                if self.busy():
+                    self.dropped_busy += 1
+                    continue
+                self._running.add(key)
+            try:
+                func(*args, **kwargs)
+                self.completed += 1
+            except Exception as e:
+                print(f"Background job {key} failed: {e}")
+                self.failed += 1
+            finally:
+                with self._condition:
+                    self._running.discard(key)
+
+    def stats(self):
+        return {
+            'queued': len(self._queue),
+            'running': len(self._running),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'deduplicated': self.deduplicated,
+            'dropped_full': self.dropped_full,
+            'dropped_busy': self.dropped_busy
+        }
+
+
+class ForegroundTracker:
+    """Counts requests in flight so background work can stay out of their way"""
+
+    def __init__(self, limit=JOB_MAX_FOREGROUND):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        from flask import g
+
+        @app.before_request
+        def enter_foreground():
+            with self._lock:
+                self.active += 1
+            g.foreground_tracked = True
+
+        @app.teardown_request
+        def leave_foreground(exc):
+            # Teardown also runs when an earlier before_request hook answered the request
+            if g.pop('foreground_tracked', False):
+                with self._lock:
+                    self.active -= 1
+
+    def busy(self):
+        return self.active > self.limit
@@ -0,0 +1,228 @@
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (16e3, 64e3, 256e3, 1e6, 4e6, 16e6)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+NAMESPACE = 'pantrychef'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = f'{NAMESPACE}_{name}'
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in items]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._stats_sources = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_stats_source(self, name, stats):
+        """Expose the numeric leaves of a component's ``stats()`` dict as gauges"""
+        self._stats_sources = [source for source in self._stats_sources if source[0] != name]
+        self._stats_sources.append((name, stats))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, stats in self._stats_sources:
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"Stats source {name} failed: {e}")
+                continue
+            for key, value in _flatten(values, f'{NAMESPACE}_{name}'):
+                lines.append(f'# TYPE {key} gauge')
+                lines.append(f'{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _flatten(values, prefix):
+    for key, value in values.items():
+        name = f'{prefix}_{key}'.replace('-', '_').replace('.', '_')
+        if isinstance(value, dict):
+            yield from _flatten(value, name)
+        elif isinstance(value, (bool, int, float)):
+            yield name, float(value)
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('route', 'method', 'status'))
+REQUEST_DB_QUERIES = registry.histogram(
+    'http_request_db_queries', 'SQL statements executed per request', ('route',), buckets=COUNT_BUCKETS)
+REQUEST_DB_TIME = registry.histogram(
+    'http_request_db_seconds', 'Time spent in SQL per request', ('route',))
+DB_QUERY_LATENCY = registry.histogram(
+    'db_query_duration_seconds', 'SQL statement latency', ('statement',))
+UPSTREAM_LATENCY = registry.histogram(
+    'upstream_request_duration_seconds', 'Spoonacular call latency', ('endpoint', 'status'))
+IMAGE_DECODE_LATENCY = registry.histogram(
+    'image_decode_duration_seconds', 'Time to decode an upload to the working size')
+IMAGE_UPLOAD_BYTES = registry.histogram(
+    'image_upload_bytes', 'Size of decoded uploads', buckets=SIZE_BUCKETS)
+ERRORS = registry.counter('errors_total', 'Handled exceptions by location', ('where',))
+REJECTED = registry.counter(
+    'requests_rejected_total', 'Requests refused by rate limiting or load shedding', ('route', 'reason'))
+RATE_LIMIT_DECISIONS = registry.counter(
+    'rate_limit_decisions_total', 'Rate limiter checks by outcome', ('outcome',))
+
+_engine_instrumented = False
+
+
+def init_app(app):
+    """Time every request and every SQL statement, and serve /metrics"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.observe(time.perf_counter() - started, route=route,
+                                    method=request.method, status=response.status_code)
+            REQUEST_DB_QUERIES.observe(g.get('db_queries', 0), route=route)
+            REQUEST_DB_TIME.observe(g.get('db_seconds', 0.0), route=route)
+        return response
+
+    if not _engine_instrumented:
+        _instrument_engines()
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_route():
+        return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _instrument_engines():
+    """Time SQL on every engine; listeners are global so this runs once per process"""
+    global _engine_instrumented
+    from flask import g, has_request_context
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    _engine_instrumented = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        DB_QUERY_LATENCY.observe(elapsed, statement=statement.lstrip().split(' ', 1)[0].upper())
+        if has_request_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_seconds = g.get('db_seconds', 0.0) + elapsed
+
+    @event.listens_for(Engine, 'handle_error')
+    def discard_query_timer(context):
+        if context.connection is not None and context.connection.info.get('query_started'):
+            context.connection.info['query_started'].pop()
@@ -0,0 +1,150 @@
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+from database import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Database Models
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    name = db.Column(db.String(80), nullable=False)
+    password_hash = db.Column(db.String(120), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    pantry_items = db.relationship('PantryItem', backref='user', lazy=True, cascade='all, delete-orphan')
+    favorite_recipes = db.relationship('FavoriteRecipe', backref='user', lazy=True, cascade='all, delete-orphan')
+    preferences = db.relationship('UserPreference', backref='user', uselist=False, cascade='all, delete-orphan')
+
+class PantryItem(db.Model):
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    quantity = db.Column(db.String(50))
+    category = db.Column(db.String(50), nullable=False)
+    expiry_date = db.Column(db.Date)
+    added_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_pantry_item_user_added', 'user_id', 'added_date'),
+        db.Index('ix_pantry_item_user_expiry', 'user_id', 'expiry_date'),
+    )
+
+class PantryState(db.Model):
+    """Per-user pantry version, bumped on every write, used for conditional GETs"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class FavoriteRecipe(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Spoonacular and bundled recipes have positive ids, imported corpus recipes negative 52-bit ones
+    recipe_id = db.Column(db.BigInteger, nullable=False)
+    spoonacular_id = db.Column(db.Integer)
+    title = db.Column(db.String(200))
+    image_url = db.Column(db.String(500))
+    added_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ux_favorite_recipe_user_recipe', 'user_id', 'recipe_id', unique=True),
+    )
+
+class UserPreference(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    dietary_restrictions = db.Column(db.Text)  # JSON string
+    favorite_cuisines = db.Column(db.Text)     # JSON string
+    cooking_skill_level = db.Column(db.String(20))
+    max_cooking_time = db.Column(db.Integer)
+
+class RecipeDetailCache(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Text, nullable=False)  # JSON string
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    stored_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class Recipe(db.Model):
+    """Imported recipe corpus; the table name matches what RecipeIndex reads from SQLite"""
+    __tablename__ = 'recipes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_id = db.Column(db.String(100), nullable=False, unique=True)
+    # Stable public id derived from source_id, so it survives re-imports
+    public_id = db.Column(db.BigInteger, nullable=False, index=True)
+    title = db.Column(db.String(300), nullable=False)
+    ingredient_names = db.Column(db.Text)  # canonical names joined with ' ; '
+    tags = db.Column(db.Text)  # joined with ' ; '
+    data = db.Column(db.Text, nullable=False)  # formatted recipe as JSON
+
+# Full-text search over recipes on SQLite: an external-content FTS5 table kept
+# in sync by triggers, so bulk inserts index themselves
+RECIPE_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5(
+        title, ingredient_names, tags,
+        content='recipes', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS recipes_fts_insert AFTER INSERT ON recipes BEGIN
+        INSERT INTO recipe_fts(rowid, title, ingredient_names, tags)
+        VALUES (new.id, new.title, new.ingredient_names, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS recipes_fts_delete AFTER DELETE ON recipes BEGIN
+        INSERT INTO recipe_fts(recipe_fts, rowid, title, ingredient_names, tags)
+        VALUES ('delete', old.id, old.title, old.ingredient_names, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS recipes_fts_update AFTER UPDATE ON recipes BEGIN
+        INSERT INTO recipe_fts(recipe_fts, rowid, title, ingredient_names, tags)
+        VALUES ('delete', old.id, old.title, old.ingredient_names, old.tags);
+        INSERT INTO recipe_fts(rowid, title, ingredient_names, tags)
+        VALUES (new.id, new.title, new.ingredient_names, new.tags);
+    END""",
+)
+
+# Schema management
+def ensure_indexes():
+    """Create indexes declared on models that predate them; create_all skips existing tables"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=db.engine, checkfirst=True)
+            except Exception as e:
+                print(f"Could not create index {index.name}: {e}")
+
+def widen_favorite_recipe_ids():
+    """Favorite tables created before corpus ids existed hold 32-bit recipe ids on PostgreSQL"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('ALTER TABLE favorite_recipe ALTER COLUMN recipe_id TYPE BIGINT')
+
+def dedupe_favorites():
+    """Drop duplicate favorites left from before the unique index existed"""
+    keep = db.session.query(db.func.min(FavoriteRecipe.id)).group_by(
+        FavoriteRecipe.user_id, FavoriteRecipe.recipe_id
+    )
+    FavoriteRecipe.query.filter(FavoriteRecipe.id.not_in(keep.scalar_subquery())).delete(synchronize_session=False)
+    db.session.commit()
+
+def ensure_recipe_search():
+    """Create the FTS5 recipe index on SQLite; other databases search with LIKE"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with db.engine.begin() as conn:
+            for ddl in RECIPE_SEARCH_DDL:
+                conn.exec_driver_sql(ddl)
+        return True
+    except Exception as e:
+        print(f"Could not create recipe search index: {e}")
+        return False
+
+def init_db():
+    """Create missing tables and indexes; run once per deploy rather than per worker"""
+    db.create_all()
+    widen_favorite_recipe_ids()
+    dedupe_favorites()
+    ensure_indexes()
+    ensure_recipe_search()
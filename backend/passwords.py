@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+# Hash jobs queued or running before new ones are turned away
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '16'))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '5'))
+
+
+def hash_prefix(method):
+    """The parameter prefix werkzeug writes for ``method``, with its defaults filled in"""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return f'scrypt:{2 ** 15}:8:1'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    return method
+
+
+class HashingBusy(Exception):
+    def __init__(self, retry_after=1):
+        super().__init__('Too many concurrent sign-ins, please retry shortly')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on a small dedicated thread pool.
+
+    The KDFs release the GIL, so a login burst occupies these workers rather
+    than the request threads serving everything else. Once
+    ``max_pending`` jobs are queued or running, further ones fail fast with
+    HashingBusy instead of piling up. A job that takes longer than
+    ``timeout`` also ends in HashingBusy.
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=PASSWORD_HASH_WORKERS,
+                 max_pending=PASSWORD_HASH_MAX_PENDING, timeout=PASSWORD_HASH_TIMEOUT):
+        self.method = method
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.rejected = 0
+        self.timed_out = 0
+        self.rehashed = 0
+        self.timings = {'hash': [0, 0.0, 0.0], 'verify': [0, 0.0, 0.0]}  # count, total, max
+        self._prefix = hash_prefix(method)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+    def _timed(self, operation, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                timing = self.timings[operation]
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = max(timing[2], elapsed)
+
+    def _run(self, operation, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy()
+        future = self._executor.submit(self._timed, operation, func, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The job keeps its slot until it finishes, so the pool is not overcommitted
+            with self._lock:
+                self.timed_out += 1
+            raise HashingBusy()
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run('verify', check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with different parameters than configured"""
+        return password_hash.split('$', 1)[0] != self._prefix
+
+    def rehash(self, password):
+        """Hash ``password`` again with the configured parameters, counting the upgrade"""
+        password_hash = self.hash(password)
+        with self._lock:
+            self.rehashed += 1
+        return password_hash
+
+    def stats(self):
+        with self._lock:
+            timings = {
+                operation: {
+                    'count': count,
+                    'avg_seconds': total / count if count else 0.0,
+                    'max_seconds': maximum
+                } for operation, (count, total, maximum) in self.timings.items()
+            }
+        return {
+            'method': self.method,
+            'timings': timings,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'rehashed': self.rehashed
+        }
+
+
+password_hasher = PasswordHasher()
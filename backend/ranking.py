@@ -0,0 +1,193 @@
+import json
+import re
+
+from ingredients import normalizer
+
+# How much each signal moves a recipe's score
+COVERAGE_WEIGHT = 3.0
+MISSING_WEIGHT = 1.0
+TIME_WEIGHT = 1.0
+CUISINE_WEIGHT = 0.5
+
+# Dietary restrictions as stored on UserPreference, mapped to the slugs of the
+# tags get_recipe_tags_from_spoonacular sets; any listed tag satisfies the restriction
+DIET_TAGS = {
+    'vegetarian': ('vegetarian', 'vegan'),
+    'vegan': ('vegan',),
+    'gluten-free': ('gluten-free',),
+    'dairy-free': ('dairy-free', 'vegan'),
+}
+
+_MINUTES = re.compile(r'\d+')
+
+
+def _slug(value):
+    return re.sub(r'[\s_]+', '-', str(value).strip().lower())
+
+
+def _json_list(text):
+    if not text:
+        return []
+    try:
+        values = json.loads(text)
+    except ValueError:
+        # Older rows hold a plain comma separated list
+        values = text.split(',')
+    if not isinstance(values, list):
+        return []
+    return [value for value in values if isinstance(value, str) and value.strip()]
+
+
+class Preferences:
+    """A user's ranking preferences, parsed once from their UserPreference row"""
+
+    def __init__(self, diets=(), cuisines=(), max_cooking_time=None):
+        self.diets = tuple(DIET_TAGS[diet] for diet in {_slug(diet) for diet in diets} if diet in DIET_TAGS)
+        self.cuisines = frozenset(_slug(cuisine) for cuisine in cuisines)
+        self.max_cooking_time = max_cooking_time or None
+
+    @classmethod
+    def from_model(cls, preference):
+        if preference is None:
+            return cls()
+        return cls(
+            diets=_json_list(preference.dietary_restrictions),
+            cuisines=_json_list(preference.favorite_cuisines),
+            max_cooking_time=preference.max_cooking_time
+        )
+
+
+DEFAULT_PREFERENCES = Preferences()
+
+
+def cook_minutes(recipe):
+    """Minutes from a formatted recipe's ``cookTime`` ("25 minutes"), or None"""
+    value = recipe.get('cookTime')
+    if isinstance(value, (int, float)):
+        return value
+    match = _MINUTES.search(value or '')
+    return int(match.group()) if match else None
+
+
+def recipe_cuisines(recipe):
+    cuisines = recipe.get('cuisines') or ([recipe['cuisine']] if recipe.get('cuisine') else [])
+    return {_slug(cuisine) for cuisine in list(cuisines) + recipe.get('tags', [])}
+
+
+def satisfies_diets(recipe, preferences):
+    """Whether a single recipe meets every dietary restriction, as rank() checks them"""
+    tags = {_slug(tag) for tag in recipe.get('tags', ())}
+    return all(any(tag in tags for tag in allowed) for allowed in preferences.diets)
+
+
+def _line_hits(lines, terms):
+    """Boolean (line, term) matrix of which terms occur in which lines.
+
+    Each term is found with one scan over all lines joined together and the
+    match offsets are mapped back to line numbers, rather than testing every
+    line and term pair. Terms only match whole words, so "egg" does not hit
+    "eggplant".
+    """
+    import numpy as np
+
+    text = '\n'.join(lines)
+    line_starts = np.zeros(len(lines), dtype=np.intp)
+    np.cumsum([len(line) + 1 for line in lines[:-1]], out=line_starts[1:])
+    hits = np.zeros((len(lines), len(terms)), dtype=bool)
+    for column, term in enumerate(terms):
+        offsets = [match.start() for match in re.finditer(rf'\b{re.escape(term)}\b', text)]
+        if offsets:
+            hits[np.searchsorted(line_starts, offsets, side='right') - 1, column] = True
+    return hits
+
+
+def rank(recipes, weights, preferences=DEFAULT_PREFERENCES, top_k=None, require_match=False):
+    """
+    Order recipes by how well they fit the pantry and the user's preferences.
+
+    ``weights`` maps pantry ingredient to weight. Each recipe's score combines
+    the weighted share of the pantry it uses, the share of its own ingredient
+    lines the pantry does not cover, how far it runs over the user's
+    ``max_cooking_time`` and whether it is one of their favorite cuisines.
+    Recipes that break a dietary restriction are dropped, as are recipes using
+    no pantry ingredient when ``require_match`` is set. Duplicate ids keep their
+    first occurrence and ties keep input order.
+    """
+    # Imported here so workers that never rank recipes do not load numpy
+    import numpy as np
+
+    seen = set()
+    unique = []
+    for recipe in recipes:
+        if recipe['id'] not in seen:
+            seen.add(recipe['id'])
+            unique.append(recipe)
+    if not unique:
+        return []
+
+    # Pantry names and ingredient lines are compared in canonical form, so
+    # "cherry tomatoes" in a recipe counts for "tomato" in the pantry
+    terms = {}
+    for name, weight in weights.items():
+        term = normalizer.normalize(name)
+        if term:
+            terms[term] = max(terms.get(term, 0), weight)
+
+    # Flatten every ingredient line so one vectorized pass tests them all;
+    # a recipe without ingredients gets one empty line that matches nothing
+    lines = []
+    starts = np.empty(len(unique), dtype=np.intp)
+    line_counts = np.empty(len(unique), dtype=np.float64)
+    for index, recipe in enumerate(unique):
+        ingredients = recipe.get('ingredients') or ()
+        starts[index] = len(lines)
+        line_counts[index] = len(ingredients)
+        lines.extend(normalizer.normalize_all(ingredients))
+        if not ingredients:
+            lines.append('')
+
+    score = np.zeros(len(unique))
+    keep = np.ones(len(unique), dtype=bool)
+    if terms:
+        term_weights = np.fromiter(terms.values(), dtype=np.float64, count=len(terms))
+        hits = _line_hits(lines, list(terms))
+        uses_term = np.logical_or.reduceat(hits, starts, axis=0)
+        covered_lines = np.add.reduceat(hits.any(axis=1), starts).astype(np.float64)
+
+        coverage = uses_term @ term_weights / term_weights.sum()
+        missing = (line_counts - np.minimum(covered_lines, line_counts)) / np.maximum(line_counts, 1)
+        score += COVERAGE_WEIGHT * coverage - MISSING_WEIGHT * missing
+        if require_match:
+            keep &= coverage > 0
+    elif require_match:
+        return []
+
+    if preferences.max_cooking_time:
+        minutes = np.array([cook_minutes(recipe) or 0 for recipe in unique], dtype=np.float64)
+        overrun = (minutes - preferences.max_cooking_time) / preferences.max_cooking_time
+        score -= TIME_WEIGHT * np.clip(overrun, 0.0, 1.0)
+
+    if preferences.cuisines:
+        favorite = np.fromiter(
+            (bool(preferences.cuisines & recipe_cuisines(recipe)) for recipe in unique),
+            dtype=bool, count=len(unique)
+        )
+        score += CUISINE_WEIGHT * favorite
+
+    if preferences.diets:
+        # Imported corpora tag in any case and spelling ("Gluten Free", "vegan")
+        tag_sets = [{_slug(tag) for tag in recipe.get('tags', ())} for recipe in unique]
+        for allowed in preferences.diets:
+            keep &= np.fromiter(
+                (any(tag in tags for tag in allowed) for tags in tag_sets), dtype=bool, count=len(unique)
+            )
+
+    candidates = np.flatnonzero(keep)
+    if top_k is not None and top_k <= 0:
+        return []
+    if top_k is not None and top_k < len(candidates):
+        # Cut to the top k first so only those get fully sorted; a boundary
+        # tie may pick the later of two equal recipes
+        candidates = candidates[np.argpartition(-score[candidates], top_k - 1)[:top_k]]
+    order = candidates[np.lexsort((candidates, -score[candidates]))]
+    return [unique[index] for index in order]
@@ -0,0 +1,230 @@
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+
+from metrics import ERRORS, RATE_LIMIT_DECISIONS, REJECTED
+
+# SQLite file holding the buckets; every worker process on the host shares it
+RATE_LIMIT_DB = os.getenv('RATE_LIMIT_DB', os.path.join(tempfile.gettempdir(), 'pantrychef-ratelimit.db'))
+# Bucket size and refill rate per signed-in user, in cost units; a plain pantry request costs 1
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', '200'))
+RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', '2'))
+# The same per IP address for anonymous calls. An address can stand for many
+# people behind NAT, so its bucket holds a couple of dozen photo-to-recipes sessions
+RATE_LIMIT_ANON_BURST = float(os.getenv('RATE_LIMIT_ANON_BURST', '600'))
+RATE_LIMIT_ANON_PER_SECOND = float(os.getenv('RATE_LIMIT_ANON_PER_SECOND', '5'))
+DEFAULT_COST = 1
+
+# Requests costing at least SHED_MIN_COST are refused while more than
+# SHED_MAX_IN_FLIGHT requests are running or the p99 latency of the last
+# SHED_WINDOW seconds is above SHED_P99_SECONDS
+SHED_MAX_IN_FLIGHT = int(os.getenv('SHED_MAX_IN_FLIGHT', '32'))
+SHED_P99_SECONDS = float(os.getenv('SHED_P99_SECONDS', '5'))
+SHED_MIN_COST = float(os.getenv('SHED_MIN_COST', '5'))
+SHED_WINDOW = float(os.getenv('SHED_WINDOW', '10'))
+SHED_RETRY_AFTER = int(os.getenv('SHED_RETRY_AFTER', '2'))
+# Fewer samples than this in the window say nothing about p99
+SHED_MIN_SAMPLES = 50
+LATENCY_SAMPLES = 5000
+PRUNE_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit_bucket (
+    key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# Refill by the time since the last take and take the cost, only if that
+# leaves the bucket non-negative; no row comes back when the take is refused
+TAKE = """
+INSERT INTO rate_limit_bucket (key, tokens, updated) VALUES (:key, :burst - :cost, :now)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = min(:burst, tokens + max(0, :now - updated) * :rate) - :cost,
+    updated = max(updated, :now)
+WHERE min(:burst, tokens + max(0, :now - updated) * :rate) >= :cost
+RETURNING tokens
+"""
+
+
+class TokenBucketStore:
+    """
+    Token buckets kept in a local SQLite file.
+
+    Each take is a single UPSERT, so worker processes sharing the file never
+    lose each other's updates and agree on every client's balance. The data is
+    disposable, so the file is written without fsync. Buckets that have been
+    idle for a long time are pruned now and then.
+
+    ``burst`` and ``rate`` are defaults; a take may pass its own.
+    """
+
+    def __init__(self, path=RATE_LIMIT_DB, burst=RATE_LIMIT_BURST, rate=RATE_LIMIT_PER_SECOND,
+                 idle_seconds=3600):
+        self.path = path
+        self.burst = burst
+        self.rate = rate
+        self.idle_seconds = idle_seconds
+        self._takes = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, and never one inherited across a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, cost, burst=None, rate=None):
+        """Take ``cost`` tokens from ``key``'s bucket; returns ``(allowed, retry_after_seconds)``"""
+        burst = self.burst if burst is None else burst
+        rate = self.rate if rate is None else rate
+        cost = min(cost, burst)
+        # Wall clock, since the buckets are shared between processes
+        now = time.time()
+        conn = self._connection()
+        params = {'key': key, 'cost': cost, 'now': now, 'burst': burst, 'rate': rate}
+        # fetchall finishes the statement, so the write lock is not held until the cursor is collected
+        taken = conn.execute(TAKE, params).fetchall()
+
+        self._takes += 1
+        if self._takes % PRUNE_EVERY == 0:
+            # Long idle buckets are full again under any sensible limits
+            conn.execute('DELETE FROM rate_limit_bucket WHERE updated < ?', (now - self.idle_seconds,))
+
+        if taken:
+            return True, 0.0
+        row = conn.execute('SELECT tokens, updated FROM rate_limit_bucket WHERE key = ?', (key,)).fetchone()
+        if row is None or rate <= 0:
+            return False, float(SHED_RETRY_AFTER)
+        tokens, updated = row
+        available = min(burst, tokens + max(0.0, now - updated) * rate)
+        return False, max(0.0, cost - available) / rate
+
+
+class RateLimiter:
+    """
+    Per-client rate limiting and load shedding, checked before every request.
+
+    Clients are keyed by JWT identity, or by IP address without a valid token;
+    anonymous addresses get larger buckets (``anonymous_limits``) since one
+    may be shared by many people. Set TRUSTED_PROXY_COUNT behind a reverse
+    proxy, or every anonymous caller shares the proxy's address. Every route
+    has a cost taken from the client's token bucket, so a few /detect calls
+    use up as much as many pantry reads; an empty bucket gets a 429. While the
+    process is overloaded, by requests in flight or recent p99 latency, routes
+    costing at least ``shed_min_cost`` get a 503 instead of queueing behind
+    everyone else. Both carry ``Retry-After``.
+
+    Load is judged per process, since that is where requests queue.
+    """
+
+    def __init__(self, store=None, costs=None, identity=None, in_flight=None,
+                 anonymous_limits=(RATE_LIMIT_ANON_BURST, RATE_LIMIT_ANON_PER_SECOND),
+                 max_in_flight=SHED_MAX_IN_FLIGHT, p99_limit=SHED_P99_SECONDS, shed_min_cost=SHED_MIN_COST,
+                 window=SHED_WINDOW, exempt=('metrics_route',)):
+        self.store = store or TokenBucketStore()
+        self.costs = costs or {}
+        # Returns the signed-in user's id, or None
+        self.identity = identity or (lambda: None)
+        self.anonymous_limits = anonymous_limits
+        self.in_flight = in_flight or (lambda: 0)
+        self.max_in_flight = max_in_flight
+        self.p99_limit = p99_limit
+        self.shed_min_cost = shed_min_cost
+        self.window = window
+        self.exempt = set(exempt)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._p99 = 0.0
+        self._p99_at = 0.0
+
+    def cost(self, endpoint):
+        return self.costs.get(endpoint, DEFAULT_COST)
+
+    def record(self, seconds):
+        """Note how long an admitted request took"""
+        self._latencies.append((time.monotonic(), seconds))
+
+    def p99(self):
+        """p99 latency over the last ``window`` seconds, recomputed at most once a second"""
+        now = time.monotonic()
+        if now - self._p99_at >= 1.0:
+            cutoff = now - self.window
+            samples = sorted(seconds for at, seconds in list(self._latencies) if at >= cutoff)
+            self._p99 = samples[int(0.99 * (len(samples) - 1))] if len(samples) >= SHED_MIN_SAMPLES else 0.0
+            self._p99_at = now
+        return self._p99
+
+    def overloaded(self):
+        return self.in_flight() > self.max_in_flight or self.p99() > self.p99_limit
+
+    def check(self, client, endpoint, anonymous=False):
+        """None when the request may go ahead, otherwise ``(status, retry_after_seconds)``"""
+        cost = self.cost(endpoint)
+        if cost >= self.shed_min_cost and self.overloaded():
+            RATE_LIMIT_DECISIONS.inc(outcome='shed')
+            return 503, SHED_RETRY_AFTER
+        burst, rate = self.anonymous_limits if anonymous else (None, None)
+        try:
+            allowed, retry_after = self.store.take(client, cost, burst, rate)
+        except sqlite3.Error as e:
+            # A broken limiter store must not take the API down with it
+            print(f"Rate limit store failed: {e}")
+            ERRORS.inc(where='rate_limit')
+            RATE_LIMIT_DECISIONS.inc(outcome='store_error')
+            return None
+        if not allowed:
+            RATE_LIMIT_DECISIONS.inc(outcome='limited')
+            return 429, retry_after
+        RATE_LIMIT_DECISIONS.inc(outcome='allowed')
+        return None
+
+    def init_app(self, app):
+        from flask import g, jsonify, request
+
+        if not app.config['RATE_LIMIT_ENABLED']:
+            return
+
+        @app.before_request
+        def limit_request():
+            if request.method == 'OPTIONS' or request.endpoint in self.exempt:
+                return None
+            # remote_addr is the client's own address once ProxyFix has read X-Forwarded-For
+            identity = self.identity()
+            if identity is not None:
+                rejection = self.check(f'user:{identity}', request.endpoint)
+            else:
+                rejection = self.check(f'ip:{request.remote_addr}', request.endpoint, anonymous=True)
+            if rejection is None:
+                g.rate_limit_started = time.perf_counter()
+                return None
+
+            status, retry_after = rejection
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REJECTED.inc(route=route, reason='rate_limited' if status == 429 else 'shed')
+            message = 'Too many requests' if status == 429 else 'Server is busy, try again shortly'
+            response = jsonify({'error': message})
+            response.status_code = status
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            return response
+
+        @app.teardown_request
+        def record_latency(exc):
+            started = g.pop('rate_limit_started', None)
+            if started is not None:
+                self.record(time.perf_counter() - started)
+
+    def stats(self):
+        # Outcome counts are the RATE_LIMIT_DECISIONS counter; these are gauges
+        return {
+            'in_flight': self.in_flight(),
+            'p99_seconds': self.p99()
+        }
@@ -0,0 +1,260 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from itertools import islice
+
+from sqlalchemy import delete, insert, or_, select, text
+
+from ingredients import normalizer
+from models import db, Recipe
+
+IMPORT_CHUNK_SIZE = int(os.getenv('RECIPE_IMPORT_CHUNK_SIZE', '2000'))
+# Column weights for bm25(): title, ingredient names, tags
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0)
+LIST_SEPARATOR = ' ; '
+
+# Alternative column names seen in public recipe dumps
+FIELD_ALIASES = {
+    'id': ('id', 'recipe_id', 'source_id'),
+    'title': ('title', 'name', 'recipe_name'),
+    'image': ('image', 'image_url', 'imageUrl'),
+    'cookTime': ('cookTime', 'cook_time', 'minutes', 'readyInMinutes', 'ready_in_minutes', 'total_time'),
+    'servings': ('servings', 'yield'),
+    'difficulty': ('difficulty',),
+    'description': ('description', 'summary'),
+    'ingredients': ('ingredients', 'ingredient_list', 'NER'),
+    'instructions': ('instructions', 'steps', 'directions'),
+    'tags': ('tags', 'keywords', 'categories'),
+    'rating': ('rating',),
+    'reviews': ('reviews', 'review_count'),
+    'youtubeUrl': ('youtubeUrl', 'youtube_url', 'video'),
+}
+LIST_FIELDS = ('ingredients', 'instructions', 'tags')
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Seconds before a missing FTS5 index is looked for again, since init-db may
+# create it while the app is running
+FTS_RECHECK_SECONDS = 60
+
+# Engine URL to (enabled, checked at); a found index is not looked for again
+_fts_enabled = {}
+
+
+# Reading
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_csv(path):
+    # Instructions in recipe dumps easily exceed the default 128 KB field limit
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+    with open(path, encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def read_recipes(path):
+    """Raw recipe dicts from a .jsonl or .csv file, streamed, or a .json array"""
+    if path.endswith('.csv'):
+        return read_csv(path)
+    if path.endswith('.jsonl'):
+        return read_jsonl(path)
+    with open(path, encoding='utf-8') as f:
+        return iter(json.load(f))
+
+
+def _parse_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value if item]
+    value = str(value).strip()
+    if value.startswith('['):
+        try:
+            return [str(item) for item in json.loads(value) if item]
+        except ValueError:
+            pass
+    return [item.strip() for item in value.split('|') if item.strip()]
+
+
+def to_recipe(raw):
+    """Map a raw row onto the formatted recipe shape the API returns"""
+    recipe = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if raw.get(alias) not in (None, ''):
+                recipe[field] = raw[alias]
+                break
+    for field in LIST_FIELDS:
+        recipe[field] = _parse_list(recipe.get(field))
+    recipe.setdefault('image', '')
+    recipe.setdefault('description', '')
+    cook_time = recipe.get('cookTime')
+    if isinstance(cook_time, (int, float)) or (isinstance(cook_time, str) and cook_time.isdigit()):
+        recipe['cookTime'] = f"{int(float(cook_time))} minutes"
+    return recipe
+
+
+def corpus_recipe_id(source_id):
+    """
+    Public id of an imported recipe, derived from its source id.
+
+    It is negative, so it never collides with Spoonacular or bundled recipe
+    ids, stays the same across re-imports, and fits in 52 bits so JavaScript
+    clients read it exactly.
+    """
+    digest = hashlib.sha1(source_id.encode('utf-8')).digest()
+    return -(int.from_bytes(digest[:7], 'big') >> 4) - 1
+
+
+def is_corpus_id(recipe_id):
+    return isinstance(recipe_id, int) and recipe_id < 0
+
+
+def to_row(raw):
+    recipe = to_recipe(raw)
+    if not recipe.get('title'):
+        return None
+    names = dict.fromkeys(name for name in normalizer.normalize_all(recipe['ingredients']) if name)
+    source_id = str(recipe.get('id') or recipe['title'])[:100]
+    return {
+        'source_id': source_id,
+        'public_id': corpus_recipe_id(source_id),
+        'title': str(recipe['title'])[:300],
+        'ingredient_names': LIST_SEPARATOR.join(names),
+        'tags': LIST_SEPARATOR.join(recipe['tags']),
+        'data': json.dumps(recipe)
+    }
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Importing
+
+def import_recipes(path, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Load a recipe dump into the recipes table, one transaction per chunk.
+
+    Only one chunk is held in memory at a time. Rows with a source id that is
+    already imported replace the old row. On SQLite the FTS index is updated
+    by triggers as rows go in and optimized once at the end.
+    """
+    fts = search_enabled()
+    imported = skipped = 0
+    for chunk in chunked(read_recipes(path), chunk_size):
+        rows = {}
+        for raw in chunk:
+            row = to_row(raw)
+            if row is None:
+                skipped += 1
+            else:
+                rows[row['source_id']] = row
+        if not rows:
+            continue
+        with db.engine.begin() as conn:
+            conn.execute(delete(Recipe.__table__).where(Recipe.__table__.c.source_id.in_(list(rows))))
+            conn.execute(insert(Recipe.__table__), list(rows.values()))
+        imported += len(rows)
+        print(f"Imported {imported} recipes")
+
+    if fts:
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO recipe_fts(recipe_fts) VALUES ('optimize')")
+    return imported, skipped
+
+
+# Searching
+
+def search_enabled():
+    """Whether the FTS5 index exists on the current engine"""
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return False
+    enabled, checked_at = _fts_enabled.get(engine.url, (False, None))
+    now = time.monotonic()
+    if not enabled and (checked_at is None or now - checked_at >= FTS_RECHECK_SECONDS):
+        with engine.connect() as conn:
+            enabled = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recipe_fts'"
+            ).first() is not None
+        _fts_enabled[engine.url] = (enabled, now)
+    return enabled
+
+
+def _fts_terms(words, column=None, operator=' '):
+    terms = [f'"{word}"' for word in words]
+    if not terms:
+        return None
+    expression = operator.join(terms)
+    return f'{column} : ({expression})' if column else f'({expression})'
+
+
+def search(query='', ingredients=(), limit=20, offset=0):
+    """
+    Recipes matching every word of ``query`` and any of ``ingredients``.
+
+    Returns ``(recipes, has_more)``. With FTS5 results are ordered by BM25
+    relevance, weighting title matches above ingredients and tags; without it
+    they come back in import order.
+    """
+    words = _TOKEN.findall(query.lower())
+    names = [name for name in dict.fromkeys(normalizer.normalize_all(ingredients)) if name]
+    if not words and not names:
+        return [], False
+
+    if search_enabled():
+        # Every term is quoted, so user input can never be read as FTS5 syntax
+        clauses = [_fts_terms(words), _fts_terms(names, 'ingredient_names', ' OR ')]
+        statement = text(
+            "SELECT recipes.public_id, recipes.data FROM recipe_fts JOIN recipes ON recipes.id = recipe_fts.rowid "
+            "WHERE recipe_fts MATCH :match ORDER BY bm25(recipe_fts, :w_title, :w_ingredients, :w_tags) "
+            "LIMIT :limit OFFSET :offset"
+        )
+        params = {
+            'match': ' AND '.join(clause for clause in clauses if clause),
+            'w_title': SEARCH_WEIGHTS[0], 'w_ingredients': SEARCH_WEIGHTS[1], 'w_tags': SEARCH_WEIGHTS[2],
+            'limit': limit + 1, 'offset': offset
+        }
+        rows = db.session.execute(statement, params).all()
+    else:
+        columns = Recipe.__table__.c
+        conditions = [
+            or_(columns.title.ilike(f'%{word}%'), columns.ingredient_names.ilike(f'%{word}%'),
+                columns.tags.ilike(f'%{word}%'))
+            for word in words
+        ]
+        if names:
+            conditions.append(or_(*[columns.ingredient_names.ilike(f'%{name}%') for name in names]))
+        statement = select(columns.public_id, columns.data).where(*conditions).order_by(columns.id)
+        rows = db.session.execute(statement.limit(limit + 1).offset(offset)).all()
+
+    recipes = [dict(json.loads(data), id=public_id) for public_id, data in rows[:limit]]
+    return recipes, len(rows) > limit
+
+
+def get_many(recipe_ids):
+    """Imported recipes by public id"""
+    recipe_ids = [recipe_id for recipe_id in recipe_ids if is_corpus_id(recipe_id)]
+    if not recipe_ids:
+        return {}
+    columns = Recipe.__table__.c
+    rows = db.session.execute(
+        select(columns.public_id, columns.data).where(columns.public_id.in_(recipe_ids))
+    ).all()
+    return {public_id: dict(json.loads(data), id=public_id) for public_id, data in rows}
@@ -0,0 +1,194 @@
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+
+def default_key(ingredient):
+    return ingredient.strip().lower()
+
+
+class _Corpus:
+    """One generation of the index; never changed once published"""
+
+    __slots__ = ('recipes', 'deleted', 'by_id', 'postings')
+
+    def __init__(self, recipes=None, deleted=None, by_id=None, postings=None):
+        self.recipes = recipes if recipes is not None else []
+        self.deleted = deleted if deleted is not None else set()
+        self.by_id = by_id if by_id is not None else {}
+        self.postings = postings if postings is not None else {}
+
+    def copy(self):
+        # Posting arrays are shared; _add_all replaces the ones it extends
+        return _Corpus(list(self.recipes), set(self.deleted), dict(self.by_id), dict(self.postings))
+
+
+class RecipeIndex:
+    """Inverted index from ingredient to recipes, loaded from a corpus file.
+
+    Supported corpora are a JSON array, JSON Lines (one recipe per line) or a
+    SQLite database with a ``recipes`` table. Postings are sorted ``array('I')``
+    lists of document numbers. The file is re-checked at most every
+    ``check_interval`` seconds. JSON Lines files that only grew are indexed
+    incrementally, anything else is rebuilt.
+
+    Reloads build a new generation on the side and publish it with a single
+    assignment, so queries never see a half-loaded corpus.
+    """
+
+    def __init__(self, path, key=default_key, check_interval=5.0, sqlite_table='recipes'):
+        self.path = path
+        self.key = key
+        self.check_interval = check_interval
+        self.sqlite_table = sqlite_table
+        self._lock = threading.Lock()
+        self._corpus = _Corpus()
+        self._signature = None
+        self._offset = 0
+        self._checked_at = 0.0
+
+    def __len__(self):
+        corpus = self._corpus
+        return len(corpus.recipes) - len(corpus.deleted)
+
+    # Loading
+
+    def refresh(self, force=False):
+        """Reload the corpus if the file changed since the last check"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except OSError as e:
+                print(f"Recipe corpus unavailable: {e}")
+                return
+            signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if not force and signature == self._signature:
+                return
+
+            appended = (
+                self._signature is not None
+                and self.path.endswith('.jsonl')
+                and stat.st_ino == self._signature[0]
+                and stat.st_size > self._signature[1]
+            )
+            if appended:
+                corpus = self._corpus.copy()
+                self._load_jsonl(corpus, start=self._offset)
+            else:
+                corpus = _Corpus()
+                self._load(corpus)
+            self._corpus = corpus
+            self._signature = signature
+
+    def _load(self, corpus):
+        if self.path.endswith('.jsonl'):
+            self._load_jsonl(corpus, start=0)
+        elif self.path.endswith(('.db', '.sqlite', '.sqlite3')):
+            self._add_all(corpus, self._read_sqlite())
+        else:
+            with open(self.path, encoding='utf-8') as f:
+                self._add_all(corpus, json.load(f))
+
+    def _load_jsonl(self, corpus, start):
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            recipes = []
+            for line in f:
+                # A trailing partial line is picked up on the next refresh
+                if not line.endswith(b'\n'):
+                    break
+                start += len(line)
+                line = line.strip()
+                if line:
+                    recipes.append(json.loads(line))
+        self._offset = start
+        self._add_all(corpus, recipes)
+
+    def _read_sqlite(self):
+        conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute(f'SELECT * FROM {self.sqlite_table}'):
+                if 'data' in row.keys():
+                    yield json.loads(row['data'])
+                    continue
+                recipe = dict(row)
+                for field in ('ingredients', 'instructions', 'tags'):
+                    if isinstance(recipe.get(field), str):
+                        recipe[field] = json.loads(recipe[field])
+                yield recipe
+        finally:
+            conn.close()
+
+    def _add_all(self, corpus, recipes):
+        new_postings = defaultdict(list)
+        for recipe in recipes:
+            doc = len(corpus.recipes)
+            previous = corpus.by_id.get(recipe.get('id'))
+            if previous is not None:
+                corpus.deleted.add(previous)
+            corpus.by_id[recipe.get('id')] = doc
+            corpus.recipes.append(recipe)
+            for term in {self.key(ing) for ing in recipe.get('ingredients', [])}:
+                if term:
+                    new_postings[term].append(doc)
+
+        # Document numbers only grow, so appending keeps every posting list sorted
+        # A new array rather than extend(), since the old one may be in use
+        for term, docs in new_postings.items():
+            postings = corpus.postings.get(term)
+            corpus.postings[term] = array('I', docs) if postings is None else postings + array('I', docs)
+
+    # Queries
+
+    def get(self, recipe_id):
+        self.refresh()
+        corpus = self._corpus
+        doc = corpus.by_id.get(recipe_id)
+        return None if doc is None or doc in corpus.deleted else corpus.recipes[doc]
+
+    def recipes(self, limit=None):
+        """Corpus recipes in file order"""
+        self.refresh()
+        corpus = self._corpus
+        live = (recipe for doc, recipe in enumerate(corpus.recipes) if doc not in corpus.deleted)
+        return list(live) if limit is None else [recipe for _, recipe in zip(range(limit), live)]
+
+    def score(self, ingredients, weights=None, corpus=None):
+        """Map document number to the (weighted) count of matching ingredients"""
+        self.refresh()
+        corpus = corpus or self._corpus
+        scores = defaultdict(float)
+        terms = {}
+        for ing in ingredients:
+            term = self.key(ing)
+            if term:
+                terms[term] = max(terms.get(term, 0), (weights or {}).get(ing, 1))
+        for term, weight in terms.items():
+            for doc in corpus.postings.get(term, ()):
+                scores[doc] += weight
+        for doc in corpus.deleted:
+            scores.pop(doc, None)
+        return scores
+
+    def match(self, ingredients, top_k=None, weights=None):
+        """Recipes sharing at least one ingredient, best overlap first"""
+        self.refresh()
+        corpus = self._corpus
+        scores = self.score(ingredients, weights, corpus)
+        # Ties keep corpus order
+        rank = lambda item: (item[1], -item[0])
+        if top_k is None:
+            ranked = sorted(scores.items(), key=rank, reverse=True)
+        else:
+            ranked = heapq.nlargest(top_k, scores.items(), key=rank)
+        return [corpus.recipes[doc] for doc, _ in ranked]
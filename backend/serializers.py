@@ -0,0 +1,112 @@
+from operator import attrgetter
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+class Serializer:
+    """
+    Turns model objects (or row dicts) into JSON-ready dicts.
+
+    The field list is compiled once into getters, so serializing a row is one
+    dict build with no per-field lookups of the spec.
+    """
+
+    def __init__(self, fields, rows=False):
+        # fields: (json name, source attribute or key, optional converter)
+        compiled = []
+        for name, source, *convert in fields:
+            compiled.append((name, self._getter(source, rows), convert[0] if convert else None))
+        self._fields = tuple(compiled)
+
+    @staticmethod
+    def _getter(source, rows):
+        if rows:
+            return lambda row: row.get(source)
+        return attrgetter(source)
+
+    def one(self, obj):
+        return {
+            name: convert(get(obj)) if convert else get(obj)
+            for name, get, convert in self._fields
+        }
+
+    def many(self, objs):
+        one = self.one
+        return [one(obj) for obj in objs]
+
+
+PANTRY_ITEM_FIELDS = (
+    ('id', 'id'),
+    ('name', 'name'),
+    ('quantity', 'quantity'),
+    ('category', 'category'),
+    ('expiryDate', 'expiry_date', _isoformat),
+    ('addedDate', 'added_date', _isoformat),
+)
+
+pantry_item = Serializer(PANTRY_ITEM_FIELDS)
+# Bulk inserts and updates work on plain column dicts
+pantry_row = Serializer(PANTRY_ITEM_FIELDS, rows=True)
+
+favorite_recipe = Serializer((
+    ('id', 'recipe_id'),
+    ('title', 'title'),
+    ('image', 'image_url'),
+    ('spoonacularId', 'spoonacular_id'),
+))
+
+# Public recipe fields in response order; anything else a corpus carries stays server side
+RECIPE_FIELDS = (
+    'id', 'title', 'image', 'cookTime', 'servings', 'difficulty', 'description', 'ingredients',
+    'instructions', 'tags', 'nutrition', 'rating', 'reviews', 'spoonacularId', 'youtubeUrl'
+)
+
+
+def recipe(item):
+    """A formatted Spoonacular or corpus recipe, limited to the public fields it has"""
+    return {name: item[name] for name in RECIPE_FIELDS if name in item}
+
+
+def recipes(items):
+    return [recipe(item) for item in items]
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson.
+
+    Datetimes still go through Flask's default hook so responses look the same
+    as with the standard provider; calls with json.dumps keyword arguments fall
+    back to it entirely.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        data = orjson.dumps(obj, default=self.default, option=self.options)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Switch the app to orjson when FAST_JSON is set and orjson is installed"""
+    if app.config.get('FAST_JSON') and orjson is not None:
+        app.json = OrjsonProvider(app)
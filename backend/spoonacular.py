@@ -0,0 +1,294 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import UPSTREAM_LATENCY
+
+SPOONACULAR_BASE_URL = os.getenv('SPOONACULAR_BASE_URL', 'https://api.spoonacular.com')
+
+# Overall budget for one /recipes search (search + details), in seconds
+REQUEST_DEADLINE = float(os.getenv('SPOONACULAR_DEADLINE', '8'))
+# Timeout for any single upstream call
+CALL_TIMEOUT = float(os.getenv('SPOONACULAR_TIMEOUT', '5'))
+DETAIL_WORKERS = int(os.getenv('SPOONACULAR_DETAIL_WORKERS', '8'))
+POOL_SIZE = int(os.getenv('SPOONACULAR_POOL_SIZE', '16'))
+
+# Circuit breaker: trip when this share of recent calls failed or were slow
+BREAKER_FAILURE_RATIO = float(os.getenv('SPOONACULAR_BREAKER_FAILURE_RATIO', '0.5'))
+BREAKER_WINDOW = int(os.getenv('SPOONACULAR_BREAKER_WINDOW', '20'))
+BREAKER_MIN_CALLS = int(os.getenv('SPOONACULAR_BREAKER_MIN_CALLS', '5'))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv('SPOONACULAR_BREAKER_SLOW_CALL', '3'))
+BREAKER_OPEN_SECONDS = float(os.getenv('SPOONACULAR_BREAKER_OPEN_SECONDS', '30'))
+
+_session = None
+_executor = None
+
+
+class SpoonacularError(Exception):
+    pass
+
+
+class CircuitOpenError(SpoonacularError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing or answering slowly.
+
+    Outcomes of the last ``window`` calls are kept; once at least
+    ``min_calls`` are recorded and the share of failures (errors, non-200
+    responses and calls slower than ``slow_call_seconds``) reaches
+    ``failure_ratio``, the breaker opens and calls fail immediately. After
+    ``open_seconds`` one probe call is let through: success closes the
+    breaker, failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_ratio=BREAKER_FAILURE_RATIO, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 slow_call_seconds=BREAKER_SLOW_CALL_SECONDS, open_seconds=BREAKER_OPEN_SECONDS):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return whether a call may go out now, claiming the probe slot when half-open"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success, elapsed):
+        failed = not success or elapsed >= self.slow_call_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(failed)
+            if (self.state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) / len(self._outcomes) >= self.failure_ratio):
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self._outcomes.clear()
+
+    def stats(self):
+        return {
+            'open': self.state == self.OPEN,
+            'half_open': self.state == self.HALF_OPEN,
+            'trips': self.trips,
+            'rejected': self.rejected
+        }
+
+
+class SingleFlight:
+    """Lets concurrent identical calls share the result of the first one"""
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, timeout=None):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            return future.result(timeout=timeout)
+
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        return {'leaders': self.leaders, 'followers': self.followers, 'in_flight': len(self._calls)}
+
+
+breaker = CircuitBreaker()
+single_flight = SingleFlight()
+
+
+class Deadline:
+    """Wall-clock budget shared by every upstream call of one request"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, cap=CALL_TIMEOUT):
+        """Timeout for the next call: the per-call cap or whatever budget is left"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise SpoonacularError('Spoonacular deadline exceeded')
+        return min(cap, remaining)
+
+
+def get_session():
+    """Shared session so every call reuses pooled keep-alive connections"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _session = session
+    return _session
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DETAIL_WORKERS, thread_name_prefix='spoonacular')
+    return _executor
+
+
+def _get(path, params, timeout, endpoint=None):
+    """GET through the circuit breaker, sharing the response with identical in-flight calls"""
+    key = (path, tuple(sorted((name, str(value)) for name, value in params.items())))
+    return single_flight.do(key, lambda: _call(path, params, timeout, endpoint), timeout=timeout)
+
+
+def _call(path, params, timeout, endpoint):
+    if not breaker.allow():
+        raise CircuitOpenError('Spoonacular circuit breaker is open')
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        response = get_session().get(f'{SPOONACULAR_BASE_URL}{path}', params=params, timeout=timeout)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        breaker.record(status == 200, elapsed)
+        UPSTREAM_LATENCY.observe(elapsed, endpoint=endpoint or path, status=status)
+    if response.status_code != 200:
+        raise SpoonacularError(f"Spoonacular API error: {response.status_code}")
+    return response.json()
+
+
+def stats():
+    return {'breaker': breaker.stats(), 'single_flight': single_flight.stats()}
+
+
+def find_by_ingredients(ingredients, filters, api_key, deadline):
+    """Call findByIngredients and return the raw list of matches"""
+    params = {
+        'apiKey': api_key,
+        'ingredients': ','.join(ingredients),
+        'number': 12,
+        'ranking': 2,
+        'ignorePantry': True,
+        **filters
+    }
+    return _get('/recipes/findByIngredients', params, deadline.timeout())
+
+
+def get_information_bulk(recipe_ids, api_key, deadline):
+    """Fetch details for many recipes in one informationBulk call, keyed by id"""
+    if not recipe_ids:
+        return {}
+    params = {
+        'apiKey': api_key,
+        'ids': ','.join(str(recipe_id) for recipe_id in recipe_ids)
+    }
+    details = _get('/recipes/informationBulk', params, deadline.timeout())
+    return {detail['id']: detail for detail in details}
+
+
+def get_information(recipe_id, api_key, deadline):
+    """Fetch details for a single recipe"""
+    return _get(f'/recipes/{recipe_id}/information', {'apiKey': api_key}, deadline.timeout(),
+                endpoint='/recipes/{id}/information')
+
+
+def iter_information_concurrent(recipe_ids, api_key, deadline):
+    """Fetch details one call per recipe on the bounded worker pool, yielding
+    ``(id, detail)`` as each call completes.
+
+    Recipes that fail or do not finish before the deadline are left out.
+    """
+    futures = {
+        get_executor().submit(get_information, recipe_id, api_key, deadline): recipe_id
+        for recipe_id in recipe_ids
+    }
+    pending = set(futures)
+    try:
+        while pending and deadline.remaining() > 0:
+            done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            for future in done:
+                recipe_id = futures[future]
+                try:
+                    detail = future.result()
+                except Exception as e:
+                    print(f"Failed to get details for recipe {recipe_id}: {e}")
+                    continue
+                yield recipe_id, detail
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def get_information_concurrent(recipe_ids, api_key, deadline):
+    return dict(iter_information_concurrent(recipe_ids, api_key, deadline))
+
+
+def iter_recipe_details(recipe_ids, api_key, deadline):
+    """Yield ``(id, detail)`` pairs from one bulk call, falling back to concurrent single lookups"""
+    try:
+        details = get_information_bulk(recipe_ids, api_key, deadline)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        print(f"Spoonacular bulk lookup failed, fetching individually: {e}")
+        yield from iter_information_concurrent(recipe_ids, api_key, deadline)
+        return
+    yield from details.items()
+
+
+def get_recipe_details(recipe_ids, api_key, deadline):
+    """Fetch details with one bulk call, falling back to concurrent single lookups"""
+    return dict(iter_recipe_details(recipe_ids, api_key, deadline))
@@ -9,6 +9,8 @@ export default defineConfig({
       '/api': {
         target: 'http://127.0.0.1:5000',
         changeOrigin: true,
+        // Pass the browser's address on; the backend reads it with TRUSTED_PROXY_COUNT=1
+        xfwd: true,
         rewrite: (path) => path.replace(/^\/api/, '')
       }
     }